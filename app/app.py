@@ -2,9 +2,12 @@ from fastapi import Depends, FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 
-from app.database.db import User, create_db_and_tables
+from app.database.base import pool_status, replica_engine
+from app.database.db import User, create_db_and_tables, read_primary_after_write
 from app.database.security import auth_backend, current_active_user, fastapi_users
 from app.exception import http_exception_handler
+from app.routes.api.bulk import bulk_router
+from app.routes.api.export import export_router
 from app.routes.view.group import group_view_route
 
 # importing the route
@@ -16,7 +19,13 @@ from app.schema.users import UserCreate, UserRead, UserUpdate
 
 from fastapi_csrf_protect import CsrfProtect
 
+from app.core.activity import activity_logger
 from app.core.csrf_settings import CsrfSettings
+from app.core.database_settings import settings as database_settings
+from app.core.minio_core import minio
+from app.core.stats import counter_reconciler
+from app.core.template_settings import settings as template_settings
+from app.templates import precompile_templates
 
 app = FastAPI(exception_handlers={HTTPException: http_exception_handler})
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -53,6 +62,8 @@ app.include_router(role_view_route, tags=["Pages", "Role"])
 app.include_router(group_view_route, tags=["Pages", "Group"])
 app.include_router(user_view_route, tags=["Pages", "User"])
 app.include_router(upload_view_route, tags=["Pages", "Upload"])
+app.include_router(bulk_router)
+app.include_router(export_router)
 
 
 @app.get("/authenticated-route")
@@ -61,16 +72,38 @@ async def authenticated_route(user: User = Depends(current_active_user)):
     return {"message": f"Hello {user.email}!"}
 
 
+# Without a replica every read goes to the primary, so no client needs the cookie
+if database_settings.database_replica_url:
+    app.middleware("http")(read_primary_after_write)
+
+
+@app.get("/database/stats")
+async def database_stats(user: User = Depends(current_active_user)):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view stats")
+    if database_settings.database_replica_url:
+        return {"primary": pool_status(), "replica": pool_status(replica_engine)}
+    return pool_status()
+
+
 @app.on_event("startup")
 async def on_startup():
     # Not needed if you setup a migration system like Alembic
     await create_db_and_tables()
     # await create_superuser()
+    if template_settings.template_mode == "production":
+        logger.info(f"{precompile_templates()} templates compiled")
+    activity_logger.start()
+    counter_reconciler.start()
     logger.info("Application started")
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    minio.shutdown()
+    await counter_reconciler.stop()
+    # Writes the activities still waiting in the queue
+    await activity_logger.stop()
     logger.info("Application shutdown")
 
 
@@ -0,0 +1,225 @@
+import asyncio
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.activity_settings import settings
+from app.core.fragment_cache import bump_data_version
+from app.database.base import async_session_maker
+from app.models.users import UserActivity, UserActivityDaily
+
+# INSERT statements supporting ON CONFLICT DO UPDATE, by dialect
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+async def add_to_daily_counts(db: AsyncSession, batch: List[Dict[str, Any]]) -> None:
+    """
+    Adds a batch of activities to the `user_activity_daily` counts, with a single
+    upsert where the database supports ON CONFLICT and a query per day and type
+    otherwise. The counts are written in the transaction of the activities.
+    """
+    counts = Counter(
+        (activity["activity_date"].date(), activity["activity_type"])
+        for activity in batch
+    )
+    # Sorted so that concurrent upserts lock the rows in the same order
+    rows = [
+        {"activity_day": day, "activity_type": activity_type, "activity_count": count}
+        for (day, activity_type), count in sorted(counts.items())
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in UPSERT_INSERTS:
+        stmt = UPSERT_INSERTS[dialect](UserActivityDaily).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["activity_day", "activity_type"],
+                set_={
+                    "activity_count": UserActivityDaily.activity_count
+                    + stmt.excluded.activity_count,
+                    "updated": func.now(),
+                },
+            )
+        )
+        return
+    for row in rows:
+        result = await db.execute(
+            update(UserActivityDaily)
+            .where(
+                UserActivityDaily.activity_day == row["activity_day"],
+                UserActivityDaily.activity_type == row["activity_type"],
+            )
+            .values(
+                activity_count=UserActivityDaily.activity_count + row["activity_count"]
+            )
+        )
+        if result.rowcount == 0:
+            await db.execute(insert(UserActivityDaily).values(row))
+
+
+async def delete_expired_activities() -> int:
+    """
+    Deletes the activities older than ACTIVITY_RETENTION_DAYS, at most
+    ACTIVITY_RETENTION_BATCH_SIZE rows per statement, each batch in its own short
+    transaction so that the table is never locked for long. Their daily counts are
+    kept.
+
+    Returns:
+        int: The number of activities deleted.
+    """
+    if not settings.activity_retention_days:
+        return 0
+    horizon = datetime.now(timezone.utc) - timedelta(
+        days=settings.activity_retention_days
+    )
+    expired = (
+        select(UserActivity.id)
+        .where(UserActivity.activity_date < horizon)
+        .limit(settings.activity_retention_batch_size)
+    )
+    deleted = 0
+    while True:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                delete(UserActivity).where(UserActivity.id.in_(expired))
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < settings.activity_retention_batch_size:
+            return deleted
+
+
+class ActivityLogger:
+    """
+    Records user activities (sign-ins, sign-ups, CRUD and upload events) without
+    writing to the database while serving the request.
+
+    `log` only puts the event on an in-process queue. A background task writes the
+    queued events to `user_activity` with one multi-row INSERT per batch, once
+    `activity_batch_size` events are waiting or `activity_flush_interval` seconds after
+    the first event of the batch. Events are dropped, with a warning, while the queue
+    is full, and the events of a batch that fails to be written are lost.
+
+    The queue belongs to the event loop of the application, so events are only recorded
+    between `start` and `stop`. Another task deletes the expired activities every
+    ACTIVITY_RETENTION_INTERVAL seconds meanwhile.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue[Dict[str, Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._retention_task: Optional[asyncio.Task] = None
+        # Whether the task waits for an event, in which case it can be cancelled
+        self._idle = False
+        self._stopping = False
+        self._dropped = 0
+
+    def log(
+        self,
+        user_id: uuid.UUID,
+        activity_type: str,
+        activity_desc: Optional[str] = None,
+    ) -> None:
+        """
+        Queues an activity of a user, e.g. log(user.id, "sign-in"). Never blocks.
+        """
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(
+                {
+                    "user_id": user_id,
+                    "activity_date": datetime.now(timezone.utc),
+                    "activity_type": activity_type,
+                    "activity_desc": activity_desc,
+                }
+            )
+        except asyncio.QueueFull:
+            self._dropped += 1
+            if self._dropped in (1, 10, 100) or self._dropped % 1000 == 0:
+                logger.warning(f"Activity queue full, {self._dropped} events dropped")
+
+    def start(self) -> None:
+        if settings.activity_log_enabled and self._task is None:
+            self._queue = asyncio.Queue(maxsize=settings.activity_queue_size)
+            self._task = asyncio.create_task(self._run())
+            if settings.activity_retention_days:
+                self._retention_task = asyncio.create_task(self._expire())
+
+    async def stop(self) -> None:
+        """
+        Stops the background task and writes the events still queued.
+        """
+        if self._task is None:
+            return
+        if self._retention_task is not None:
+            # An interrupted deletion is rolled back and done again on the next start
+            self._retention_task.cancel()
+            await asyncio.gather(self._retention_task, return_exceptions=True)
+            self._retention_task = None
+        # A batch being written is let finish, the task only stops between batches
+        self._stopping = True
+        if self._idle:
+            self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        while not self._queue.empty():
+            await self._write(self._next_batch())
+        self._task = None
+        self._queue = None
+        self._stopping = False
+
+    def _next_batch(
+        self, first: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        batch = [] if first is None else [first]
+        while len(batch) < settings.activity_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            self._idle = True
+            first = await self._queue.get()
+            self._idle = False
+            deadline = loop.time() + settings.activity_flush_interval
+            # Leaves the batch time to fill up, unless it is already full
+            while (
+                not self._stopping
+                and self._queue.qsize() + 1 < settings.activity_batch_size
+                and loop.time() < deadline
+            ):
+                await asyncio.sleep(min(0.1, deadline - loop.time()))
+            await self._write(self._next_batch(first))
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            async with async_session_maker() as session:
+                await session.execute(insert(UserActivity).values(batch))
+                await add_to_daily_counts(session, batch)
+                await session.commit()
+        except Exception as err:
+            logger.error(f"Failed to write {len(batch)} activity events: {err}")
+            return
+        await bump_data_version(UserActivityDaily.__tablename__)
+
+    async def _expire(self) -> None:
+        while True:
+            try:
+                deleted = await delete_expired_activities()
+                if deleted:
+                    logger.info(f"{deleted} expired activities deleted")
+            except Exception as err:
+                logger.error(f"Failed to delete the expired activities: {err}")
+            await asyncio.sleep(settings.activity_retention_interval)
+
+
+activity_logger = ActivityLogger()
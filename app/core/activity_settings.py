@@ -0,0 +1,34 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # Records sign-ins, sign-ups, CRUD and upload events in the user_activity table.
+    activity_log_enabled: bool = Field(alias="ACTIVITY_LOG_ENABLED", default=True)
+    # Events waiting to be written; further events are dropped while the queue is full.
+    activity_queue_size: int = Field(alias="ACTIVITY_QUEUE_SIZE", default=10000, gt=0)
+    # Maximum number of events written by a single multi-row INSERT.
+    activity_batch_size: int = Field(alias="ACTIVITY_BATCH_SIZE", default=500, gt=0)
+    # Seconds an event may wait for its batch to fill up before being written.
+    activity_flush_interval: float = Field(
+        alias="ACTIVITY_FLUSH_INTERVAL", default=2.0, gt=0
+    )
+    # Days the activities are kept (0 keeps them forever); the daily counts are kept.
+    activity_retention_days: int = Field(
+        alias="ACTIVITY_RETENTION_DAYS", default=90, ge=0
+    )
+    # Seconds between two deletions of the expired activities.
+    activity_retention_interval: float = Field(
+        alias="ACTIVITY_RETENTION_INTERVAL", default=3600.0, gt=0
+    )
+    # Maximum number of activities deleted by a single statement and transaction.
+    activity_retention_batch_size: int = Field(
+        alias="ACTIVITY_RETENTION_BATCH_SIZE", default=1000, gt=0
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
@@ -0,0 +1,89 @@
+import importlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.core.cache_settings import settings
+
+
+class CacheBackend(ABC):
+    """
+    Interface of the key/value stores behind the app caches.
+
+    Values are plain Python data (dicts, lists, UUIDs, datetimes...). A backend shared
+    between workers has to serialise them, for example with pickle.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Returns the value stored under `key`, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Stores `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Removes `key`, doing nothing if it is not stored."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Removes every key."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process cache, evicting the least recently used entries beyond `max_size`.
+
+    Entries are not shared between workers, so an invalidation only reaches the worker
+    that handled the change and the others serve the old value until it expires.
+    """
+
+    def __init__(self, max_size: int = settings.cache_max_size):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def create_cache_backend() -> CacheBackend:
+    """
+    Instantiates the backend named by the CACHE_BACKEND setting. Backends other than
+    MemoryCacheBackend are built without arguments and read their own configuration.
+    """
+    module_name, _, class_name = settings.cache_backend.rpartition(".")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    if backend_class is MemoryCacheBackend:
+        return MemoryCacheBackend(settings.cache_max_size)
+    return backend_class()
+
+
+cache = create_cache_backend()
@@ -0,0 +1,37 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # Dotted path of the CacheBackend class used by the app caches. A shared backend
+    # (Redis, Memcached...) lets several workers share entries and invalidations.
+    cache_backend: str = Field(
+        alias="CACHE_BACKEND", default="app.core.cache.MemoryCacheBackend"
+    )
+    # Maximum number of entries kept by the in-process backend.
+    cache_max_size: int = Field(alias="CACHE_MAX_SIZE", default=10000, gt=0)
+    # Seconds a user resolved from a JWT is served from the cache, 0 disables it.
+    user_cache_ttl: float = Field(alias="USER_CACHE_TTL", default=30, ge=0)
+    # Seconds a rendered HTMX fragment is kept for its data version, 0 disables it.
+    # With the in-process backend, it also bounds how long the ETags of a page stay
+    # valid after another worker wrote its rows.
+    fragment_cache_ttl: float = Field(alias="FRAGMENT_CACHE_TTL", default=300, ge=0)
+    # Seconds a reference table (e.g. the roles of a dropdown) is served from the cache.
+    # Writes through the app invalidate it at once, this bounds how long other workers
+    # with an in-process backend keep the old rows. 0 disables it.
+    reference_cache_ttl: float = Field(alias="REFERENCE_CACHE_TTL", default=300, ge=0)
+    # Seconds the total of a paginated list is served from the cache, 0 disables it.
+    # Writes through the app invalidate it at once.
+    count_cache_ttl: float = Field(alias="COUNT_CACHE_TTL", default=30, ge=0)
+    # Row count from which PostgreSQL tables are counted from the planner statistics
+    # (pg_class.reltuples) instead of with COUNT(*), when the list is not filtered.
+    count_estimate_threshold: int = Field(
+        alias="COUNT_ESTIMATE_THRESHOLD", default=100000, ge=0
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+# The .env file of the project, whatever directory the app is started from
+ENV_FILE = Path(__file__).resolve().parents[2] / ".env"
+
+
+class Settings(BaseSettings):
+    database_url: str = Field(alias="DATABASE_URL")
+    # Read-only replica used by the GET view routes, None sends every query to the
+    # primary.
+    database_replica_url: Optional[str] = Field(
+        alias="DATABASE_REPLICA_URL", default=None
+    )
+    # Seconds during which a client that has just written reads from the primary, so it
+    # sees its own changes while the replica catches up.
+    database_replica_stickiness: int = Field(
+        alias="DATABASE_REPLICA_STICKINESS", default=5, ge=0
+    )
+    database_echo: bool = Field(alias="DATABASE_ECHO", default=False)
+    # Connections kept open by the pool, and extra ones opened under load.
+    database_pool_size: int = Field(alias="DATABASE_POOL_SIZE", default=5, ge=1)
+    database_max_overflow: int = Field(alias="DATABASE_MAX_OVERFLOW", default=10, ge=0)
+    # Seconds a request waits for a free connection before failing.
+    database_pool_timeout: float = Field(
+        alias="DATABASE_POOL_TIMEOUT", default=30, gt=0
+    )
+    # Seconds after which a connection is replaced, -1 keeps connections forever.
+    database_pool_recycle: int = Field(alias="DATABASE_POOL_RECYCLE", default=1800)
+    # Checks connections before handing them out, to survive server restarts.
+    database_pool_pre_ping: bool = Field(alias="DATABASE_POOL_PRE_PING", default=True)
+    # Prepared statements cached per PostgreSQL (asyncpg) connection, 0 disables the
+    # cache as required behind PgBouncer in transaction pooling mode.
+    database_statement_cache_size: int = Field(
+        alias="DATABASE_STATEMENT_CACHE_SIZE", default=100, ge=0
+    )
+    # SQLite file databases: write-ahead logging lets readers work during a write, and
+    # writers wait up to the busy timeout (seconds) instead of failing with
+    # "database is locked".
+    sqlite_wal: bool = Field(alias="SQLITE_WAL", default=True)
+    sqlite_busy_timeout: float = Field(alias="SQLITE_BUSY_TIMEOUT", default=5, ge=0)
+    sqlite_mmap_size: int = Field(
+        alias="SQLITE_MMAP_SIZE", default=256 * 1024 * 1024, ge=0
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=ENV_FILE, env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
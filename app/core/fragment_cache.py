@@ -0,0 +1,187 @@
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from sqlalchemy import inspect
+
+from app.core.cache import MemoryCacheBackend, cache
+from app.core.cache_settings import settings
+from app.database.base import Base
+from app.templates import templates
+
+# Write generations outlive the fragments rendered under them when the cache is shared
+# by the workers
+GENERATION_TTL = 24 * 60 * 60
+
+
+def _generation_ttl() -> float:
+    """
+    An in-process cache does not see the writes handled by the other workers, so its
+    generations only live as long as a fragment. That bounds the time a page written by
+    another worker is still served from the cache or answered with 304.
+    """
+    if isinstance(cache, MemoryCacheBackend):
+        return min(GENERATION_TTL, settings.fragment_cache_ttl)
+    return GENERATION_TTL
+
+
+def _generation_key(table_name: str) -> str:
+    return f"table-generation:{table_name}"
+
+
+def _written_key(table_name: str) -> str:
+    return f"table-written:{table_name}"
+
+
+async def bump_data_version(*table_names: str) -> None:
+    """
+    Marks the given tables as changed, so that fragments showing their rows are rendered
+    again. Called by SQLAlchemyCRUD after every write.
+    """
+    for table_name in table_names:
+        await cache.set(
+            _generation_key(table_name), uuid.uuid4().hex, _generation_ttl()
+        )
+        await cache.set(_written_key(table_name), time.time(), GENERATION_TTL)
+
+
+async def written_within(table_name: str, seconds: float) -> bool:
+    """
+    Whether the table was written through the app in the last `seconds` seconds.
+    """
+    written = await cache.get(_written_key(table_name))
+    return written is not None and time.time() - written < seconds
+
+
+async def table_generation(table_name: str) -> str:
+    """
+    Returns the write generation of a table, changed by `bump_data_version`. A table not
+    written since its generation expired gets a new one, so that a version is never
+    used again for other rows.
+    """
+    key = _generation_key(table_name)
+    generation = await cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        await cache.set(key, generation, _generation_ttl())
+    return generation
+
+
+def cascaded_tables(model: Type[Base]) -> List[str]:
+    """
+    Returns the tables whose rows the ORM or database cascades may change when a record
+    of `model` is deleted: those of its relationships and association tables.
+    """
+    tables = []
+    for relationship in inspect(model).relationships:
+        tables.append(relationship.mapper.local_table.name)
+        if relationship.secondary is not None:
+            tables.append(relationship.secondary.name)
+    return tables
+
+
+async def data_version(*models: Type[Base]) -> str:
+    """
+    Returns a version of the rows of the given tables, built from their write
+    generations without querying the tables. It changes whenever one of them is written
+    through SQLAlchemyCRUD, the user manager or the activity logger. Writes made outside
+    of the app are only seen once the cached entries expire, and so are the writes of
+    other workers without a shared CACHE_BACKEND.
+    """
+    generations = [await table_generation(model.__tablename__) for model in models]
+    return hashlib.sha1(json.dumps(generations).encode()).hexdigest()
+
+
+def make_etag(template_name: str, version: str, context: Dict[str, Any]) -> str:
+    """
+    Returns the weak ETag of a template rendered for the data `version` with the given
+    context values (everything other than the queried rows the markup depends on).
+    """
+    key = hashlib.sha1(
+        json.dumps([template_name, version, context], default=str).encode()
+    ).hexdigest()
+    return f'W/"{key}"'
+
+
+def page_etag(
+    template_name: str,
+    version: Optional[str],
+    context: Dict[str, Any],
+    csrf_cookie: Optional[str],
+) -> Optional[str]:
+    """
+    Returns the ETag of a full page. Pages embed the CSRF token paired with the CSRF
+    cookie, so a cached page only stays valid while the browser holds that same cookie.
+    A page without a data `version` gets no ETag.
+    """
+    if version is None:
+        return None
+    return make_etag(template_name, version, {**context, "csrf_cookie": csrf_cookie})
+
+
+def validation_headers(etag: Optional[str]) -> Dict[str, str]:
+    # The markup is per user and must be revalidated on every use
+    if etag is None:
+        return {"Cache-Control": "private, no-cache"}
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def is_not_modified(request: Request, etag: Optional[str]) -> bool:
+    if etag is None:
+        return False
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=validation_headers(etag))
+
+
+async def render_fragment(
+    request: Request,
+    template_name: str,
+    version: Optional[str],
+    context: Dict[str, Any],
+    load_context: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Response:
+    """
+    Renders an HTMX fragment through the fragment cache.
+
+    The cache key is the template name, the data `version` and the values of `context`,
+    which must hold everything else the markup depends on (CSRF token, user type...).
+    On a miss `load_context` is awaited to query the rows, so a hit costs neither the
+    queries nor the render. The response carries the key as a weak ETag and a matching
+    If-None-Match is answered with 304. Without a data `version` the fragment is
+    rendered every time and gets no ETag.
+
+    Args:
+        request (Request): The request being answered.
+        template_name (str): The fragment template.
+        version (Optional[str]): The version of the data shown, usually from
+            `data_version`, or None for rows that may be outdated.
+        context (Dict[str, Any]): The template context other than the queried rows.
+        load_context (Callable): Returns the queried rows to add to the context.
+
+    Returns:
+        Response: The rendered fragment, or an empty 304 response.
+    """
+    if version is None:
+        template_context = {"request": request, **context, **await load_context()}
+        content = templates.get_template(template_name).render(template_context)
+        return HTMLResponse(content, headers=validation_headers(None))
+
+    etag = make_etag(template_name, version, context)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    content = await cache.get(f"fragment:{etag}")
+    if content is None:
+        template_context = {"request": request, **context, **await load_context()}
+        content = templates.get_template(template_name).render(template_context)
+        if settings.fragment_cache_ttl:
+            await cache.set(f"fragment:{etag}", content, settings.fragment_cache_ttl)
+    return HTMLResponse(content, headers=validation_headers(etag))
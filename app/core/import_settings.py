@@ -0,0 +1,23 @@
+import os
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # Rows validated and inserted per multi-row INSERT by the bulk import endpoints.
+    import_chunk_size: int = Field(alias="IMPORT_CHUNK_SIZE", default=500, gt=0)
+    # Maximum number of rows accepted by a single bulk import request.
+    import_max_rows: int = Field(alias="IMPORT_MAX_ROWS", default=50000, gt=0)
+    # Threads hashing the passwords of imported users. Each hash holds the memory cost
+    # of the password hasher (64 MiB for the default Argon2 settings).
+    import_hash_workers: int = Field(
+        alias="IMPORT_HASH_WORKERS", default=os.cpu_count() or 1, ge=1
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
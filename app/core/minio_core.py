@@ -1,5 +1,10 @@
+import asyncio
 import io
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List
 
 from fastapi import UploadFile
 from minio import Minio
@@ -8,7 +13,95 @@ from minio.error import S3Error
 from app.core.minio_settings import settings
 
 
+class SDKPool:
+    """
+    A bounded thread pool running blocking MinIO SDK calls, with its metrics.
+    """
+
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+        self._timeouts = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the pool metrics: calls waiting for a worker (queued), calls being
+        executed (running), finished calls (completed) and calls that timed out.
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._submitted - self._running - self._completed,
+                "running": self._running,
+                "completed": self._completed,
+                "timeouts": self._timeouts,
+            }
+
+    def _track(self, started: Callable[[], Any], func: Callable[..., Any]) -> Any:
+        with self._lock:
+            self._running += 1
+        started()
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, timeout: float, func: Callable[..., Any], *args, **kwargs):
+        """
+        Runs a blocking SDK call on the pool. The timeout counts from the moment a
+        worker picks the call up, the time spent waiting in the queue is not counted.
+
+        Raises:
+            TimeoutError: If the call does not finish within `timeout` seconds. The
+            worker thread cannot be interrupted and finishes the call in the background.
+        """
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        with self._lock:
+            self._submitted += 1
+        future = self._executor.submit(
+            self._track,
+            partial(loop.call_soon_threadsafe, started.set),
+            partial(func, *args, **kwargs),
+        )
+        try:
+            await started.wait()
+        except BaseException:
+            # A call still waiting for a worker is dropped from the queue when the
+            # request is abandoned
+            with self._lock:
+                if future.cancel():
+                    self._submitted -= 1
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 class MinioClient:
+    """
+    Async adapter around the synchronous MinIO SDK.
+
+    Every SDK call runs on a bounded thread pool so that network transfers never block
+    the event loop, and is abandoned with an error once its timeout expires. Uploads
+    run on a pool of their own, so that long transfers never hold up the metadata calls
+    and the chunk reads of the downloads.
+    """
+
     def __init__(self):
         self.minio_url = settings.minio_url.replace("http://", "").replace(
             "https://", ""
@@ -20,44 +113,192 @@ class MinioClient:
             secure=settings.minio_secure,
         )
         self.bucket_name = settings.minio_bucket
+        # The SDK holds about three copies of the part it is reading (read buffer,
+        # trimmed part and request body) and two of every other part in flight,
+        # so only as many parallel parts as fit in the memory limit are allowed
+        part_size = settings.minio_part_size
+        self.parallel_uploads = 1 + max(
+            0, (settings.minio_upload_memory_limit - 3 * part_size) // (2 * part_size)
+        )
+        self._operations = SDKPool(settings.minio_max_workers, "minio")
+        self._transfers = SDKPool(settings.minio_transfer_workers, "minio-transfer")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the metrics of the pool of the metadata calls and chunk reads
+        (operations) and of the pool of the uploads (transfers).
+        """
+        return {
+            "operations": self._operations.stats(),
+            "transfers": self._transfers.stats(),
+        }
+
+    async def _run(self, timeout: float, func: Callable[..., Any], *args, **kwargs):
+        return await self._operations.run(timeout, func, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self._operations.shutdown()
+        self._transfers.shutdown()
 
     async def create_bucket(self) -> str:
-        try:
+        def create():
             if not self.minio_client.bucket_exists(self.bucket_name):
                 self.minio_client.make_bucket(self.bucket_name)
+
+        try:
+            await self._run(settings.minio_operation_timeout, create)
             return f"Bucket '{self.bucket_name}' created successfully"
         except S3Error as err:
             return f"Error occurred: {err}"
+        except TimeoutError:
+            return "Error occurred: creating the bucket timed out"
 
     async def upload_file(self, file: UploadFile, object_name: str) -> str:
         try:
-            content = await file.read()
-            self.minio_client.put_object(
-                self.bucket_name, object_name, io.BytesIO(content), length=len(content)
-            )
+            if settings.minio_streaming_upload:
+                # Feeds the spooled upload to MinIO part by part (multipart upload
+                # with unknown length), so at most `minio_upload_memory_limit` bytes
+                # of the file are held in memory at once
+                await file.seek(0)
+                await self._transfers.run(
+                    settings.minio_transfer_timeout,
+                    self.minio_client.put_object,
+                    self.bucket_name,
+                    object_name,
+                    file.file,
+                    length=-1,
+                    part_size=settings.minio_part_size,
+                    num_parallel_uploads=self.parallel_uploads,
+                    content_type=file.content_type or "application/octet-stream",
+                )
+            else:
+                content = await file.read()
+                await self._transfers.run(
+                    settings.minio_transfer_timeout,
+                    self.minio_client.put_object,
+                    self.bucket_name,
+                    object_name,
+                    io.BytesIO(content),
+                    length=len(content),
+                )
             return f"{settings.minio_url}/{self.bucket_name}/{object_name}"
         except S3Error as err:
             return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: uploading '{object_name}' timed out"
 
-    async def get_file(self, object_name: str):
+    async def stat_file(self, object_name: str):
         try:
-            return self.minio_client.get_object(self.bucket_name, object_name)
+            return await self._run(
+                settings.minio_operation_timeout,
+                self.minio_client.stat_object,
+                self.bucket_name,
+                object_name,
+            )
+        except S3Error as err:
+            return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: getting the details of '{object_name}' timed out"
+
+    async def get_file(
+        self, object_name: str, offset: int = 0, length: int = 0, etag: str = ""
+    ):
+        """
+        Opens the object, or `length` bytes of it from `offset` (the whole rest of the
+        object when `length` is 0). When `etag` is given the request fails if the object
+        has been replaced since its ETag was read.
+        """
+        try:
+            return await self._run(
+                settings.minio_operation_timeout,
+                self.minio_client.get_object,
+                self.bucket_name,
+                object_name,
+                offset=offset,
+                length=length,
+                request_headers={"If-Match": etag} if etag else None,
+            )
+        except S3Error as err:
+            return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: getting '{object_name}' timed out"
+
+    async def iter_file(self, response) -> AsyncIterator[bytes]:
+        """
+        Reads an object opened by `get_file` chunk by chunk on the MinIO thread pool,
+        and releases its connection back to the pool once done or abandoned.
+        """
+        try:
+            while True:
+                chunk = await self._run(
+                    settings.minio_operation_timeout,
+                    response.read,
+                    settings.minio_download_chunk_size,
+                )
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def presigned_upload_url(self, object_name: str) -> str:
+        try:
+            return await self._run(
+                settings.minio_operation_timeout,
+                self.minio_client.presigned_put_object,
+                self.bucket_name,
+                object_name,
+                expires=timedelta(seconds=settings.minio_presigned_expiry),
+            )
         except S3Error as err:
             return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: signing the upload of '{object_name}' timed out"
+
+    async def presigned_download_url(self, object_name: str, filename: str) -> str:
+        try:
+            return await self._run(
+                settings.minio_operation_timeout,
+                self.minio_client.presigned_get_object,
+                self.bucket_name,
+                object_name,
+                expires=timedelta(seconds=settings.minio_presigned_expiry),
+                response_headers={
+                    "response-content-disposition": f"attachment; filename={filename}"
+                },
+            )
+        except S3Error as err:
+            return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: signing the download of '{object_name}' timed out"
 
     async def remove_file(self, object_name: str) -> str:
         try:
-            self.minio_client.remove_object(self.bucket_name, object_name)
+            await self._run(
+                settings.minio_operation_timeout,
+                self.minio_client.remove_object,
+                self.bucket_name,
+                object_name,
+            )
             return f"File '{object_name}' removed successfully"
         except S3Error as err:
             return f"Error occurred: {err}"
+        except TimeoutError:
+            return f"Error occurred: removing '{object_name}' timed out"
 
     async def list_files(self) -> List[str]:
-        try:
+        def list_names():
+            # list_objects is lazy, the listing requests happen while iterating
             objects = self.minio_client.list_objects(self.bucket_name)
             return [obj.object_name for obj in objects]
+
+        try:
+            return await self._run(settings.minio_operation_timeout, list_names)
         except S3Error as err:
             return [f"Error occurred: {err}"]
+        except TimeoutError:
+            return ["Error occurred: listing the files timed out"]
 
 
 minio = MinioClient()
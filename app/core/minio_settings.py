@@ -1,4 +1,5 @@
-from pydantic import Field
+from minio.helpers import MIN_PART_SIZE
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,10 +10,48 @@ class Settings(BaseSettings):
     minio_bucket: str = Field(alias="MINIO_BUCKET")
     # Should be kept True for production to enforce HTTPS connections to the MinIO server.
     minio_secure: bool = Field(alias="MINIO_SECURE", default=False)
+    # Streams uploads to MinIO in parts instead of reading the whole file in memory.
+    minio_streaming_upload: bool = Field(alias="MINIO_STREAMING_UPLOAD", default=True)
+    # Size in bytes of each multipart upload part, MinIO requires at least 5 MiB.
+    minio_part_size: int = Field(alias="MINIO_PART_SIZE", default=MIN_PART_SIZE)
+    # Upper bound in bytes of the part buffers held in memory by a single upload.
+    minio_upload_memory_limit: int = Field(
+        alias="MINIO_UPLOAD_MEMORY_LIMIT", default=32 * 1024 * 1024
+    )
+    # Size of the thread pool running the blocking MinIO SDK calls other than uploads.
+    minio_max_workers: int = Field(alias="MINIO_MAX_WORKERS", default=8, ge=1)
+    # Size of the thread pool of the uploads, kept apart from the other calls.
+    minio_transfer_workers: int = Field(alias="MINIO_TRANSFER_WORKERS", default=4, ge=1)
+    # Timeouts in seconds for metadata calls (stat, delete, list...) and for transfers.
+    minio_operation_timeout: float = Field(
+        alias="MINIO_OPERATION_TIMEOUT", default=10.0
+    )
+    minio_transfer_timeout: float = Field(alias="MINIO_TRANSFER_TIMEOUT", default=300.0)
+    # Size in bytes of the chunks read from MinIO when streaming a download.
+    minio_download_chunk_size: int = Field(
+        alias="MINIO_DOWNLOAD_CHUNK_SIZE", default=256 * 1024, gt=0
+    )
+    # Lets the browser upload and download files straight to and from MinIO through
+    # presigned URLs valid for MINIO_PRESIGNED_EXPIRY seconds, instead of via the app.
+    minio_direct_transfer: bool = Field(alias="MINIO_DIRECT_TRANSFER", default=False)
+    minio_presigned_expiry: int = Field(
+        alias="MINIO_PRESIGNED_EXPIRY", default=15 * 60, gt=0, le=7 * 24 * 60 * 60
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
 
+    @model_validator(mode="after")
+    def validate_part_size(self):
+        if self.minio_part_size < MIN_PART_SIZE:
+            raise ValueError(f"MINIO_PART_SIZE must be at least {MIN_PART_SIZE} bytes")
+        # Reading a part briefly holds about three copies of it (see MinioClient)
+        if self.minio_upload_memory_limit < 3 * self.minio_part_size:
+            raise ValueError(
+                "MINIO_UPLOAD_MEMORY_LIMIT must be at least 3 times MINIO_PART_SIZE"
+            )
+        return self
+
 
 settings = Settings()
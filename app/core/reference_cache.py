@@ -0,0 +1,49 @@
+from typing import Annotated, Any, Dict, List, Type
+
+from fastapi import Depends
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache
+from app.core.cache_settings import settings
+from app.core.fragment_cache import table_generation
+from app.database.base import Base
+from app.database.db import CurrentAsyncSession
+from app.models.users import Role
+
+
+async def reference_rows(db: AsyncSession, model: Type[Base]) -> List[Dict[str, Any]]:
+    """
+    Returns all the rows of a small lookup table (roles, groups...) as column dicts,
+    ordered by (created, id), from a cache shared by all the requests of the process.
+
+    The entries are keyed by the write generation of the table, so a create, update or
+    delete made through SQLAlchemyCRUD makes the next call load the rows again. The
+    query is only run on a miss, at most once every REFERENCE_CACHE_TTL seconds.
+
+    `db` must be a primary session. Templates read the dicts like the records, e.g.
+    `role.role_name`.
+    """
+    table_name = model.__tablename__
+    key = f"reference:{table_name}:{await table_generation(table_name)}"
+    rows = await cache.get(key)
+    if rows is None:
+        query = await db.execute(select(model).order_by(model.created, model.id))
+        columns = [attr.key for attr in inspect(model).column_attrs]
+        rows = [
+            {column: getattr(record, column) for column in columns}
+            for record in query.scalars().all()
+        ]
+        if settings.reference_cache_ttl:
+            await cache.set(key, rows, settings.reference_cache_ttl)
+    return rows
+
+
+# Loaded from the primary: rows read from a lagging replica would be cached under the
+# generation of a write they miss, for REFERENCE_CACHE_TTL seconds
+async def get_reference_roles(db: CurrentAsyncSession) -> List[Dict[str, Any]]:
+    return await reference_rows(db, Role)
+
+
+# All the roles, e.g. for the role dropdowns, without a query while they are unchanged
+ReferenceRoles = Annotated[List[Dict[str, Any]], Depends(get_reference_roles)]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from loguru import logger
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.fragment_cache import bump_data_version, table_generation
+from app.core.stats_settings import settings
+from app.database.base import async_session_maker
+from app.database.db import may_lag
+from app.models.groups import Group
+from app.models.stats import StatCounter
+from app.models.upload import Upload
+from app.models.users import Role, User
+
+
+def _field(record: Any, name: str) -> Any:
+    if isinstance(record, dict):
+        return record.get(name)
+    return getattr(record, name)
+
+
+# The counters kept for each table, as the counter name mapped to the amount a record
+# adds to it. Users are active unless created otherwise.
+TABLE_COUNTERS: Dict[str, Dict[str, Callable[[Any], int]]] = {
+    User.__tablename__: {
+        "users": lambda record: 1,
+        "active_users": lambda record: int(_field(record, "is_active") is not False),
+    },
+    Group.__tablename__: {"groups": lambda record: 1},
+    Role.__tablename__: {"roles": lambda record: 1},
+    Upload.__tablename__: {
+        "uploads": lambda record: 1,
+        "upload_bytes": lambda record: _field(record, "file_size") or 0,
+    },
+}
+
+# The query counting each counter from its table, run by the reconciliation only
+COUNTER_QUERIES = {
+    "users": select(func.count()).select_from(User),
+    "active_users": select(func.count()).select_from(User).where(User.is_active),
+    "groups": select(func.count()).select_from(Group),
+    "roles": select(func.count()).select_from(Role),
+    "uploads": select(func.count()).select_from(Upload),
+    "upload_bytes": select(func.coalesce(func.sum(Upload.file_size), 0)),
+}
+
+
+async def add_to_counters(
+    db: AsyncSession, table_name: str, records: Iterable[Any], sign: int = 1
+) -> None:
+    """
+    Adds (sign=1) or removes (sign=-1) records, as models or dicts, to the counters of
+    their table, with one UPDATE per changed counter. Nothing is committed, so the
+    counters change in the transaction of the records.
+    """
+    counters = TABLE_COUNTERS.get(table_name)
+    if not counters:
+        return
+    records = list(records)
+    for name, amount in counters.items():
+        await add_to_counter(db, name, sign * sum(amount(record) for record in records))
+
+
+async def add_to_counter(db: AsyncSession, name: str, delta: int) -> None:
+    if delta:
+        await db.execute(
+            update(StatCounter)
+            .where(StatCounter.name == name)
+            .values(value=StatCounter.value + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def read_counters(db: AsyncSession) -> Dict[str, int]:
+    query = await db.execute(select(StatCounter.name, StatCounter.value))
+    values = dict(query.all())
+    return {name: values.get(name, 0) for name in COUNTER_QUERIES}
+
+
+async def counters_version(db: AsyncSession) -> Optional[str]:
+    """
+    Returns a version of the counters, changing with every write to a counted table and
+    with every reconciliation, without reading the counters. Returns None when the
+    counters read with `db` may miss recent writes (see `may_lag`).
+    """
+    tables = [StatCounter.__tablename__, *TABLE_COUNTERS]
+    if await may_lag(db, *tables):
+        return None
+    return json.dumps([await table_generation(table) for table in tables])
+
+
+async def reconcile_counters() -> None:
+    """
+    Sets every counter to the count of its table, creating the missing counters, so that
+    drifts (writes made outside of SQLAlchemyCRUD, failed transactions...) do not last.
+
+    Each counter is recounted by the UPDATE storing it, which keeps the window for a
+    concurrent create or delete to be lost as small as possible.
+    """
+    async with async_session_maker() as session:
+        stored = set((await session.scalars(select(StatCounter.name))).all())
+        for name, query in COUNTER_QUERIES.items():
+            if name in stored:
+                await session.execute(
+                    update(StatCounter)
+                    .where(StatCounter.name == name)
+                    .values(value=query.scalar_subquery())
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                value = (await session.execute(query)).scalar_one()
+                session.add(StatCounter(name=name, value=value))
+        await session.commit()
+    await bump_data_version(StatCounter.__tablename__)
+
+
+class CounterReconciler:
+    """
+    Reconciles the counters when the application starts, then every
+    STATS_RECONCILE_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # An interrupted reconciliation is rolled back
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await reconcile_counters()
+            except Exception as err:
+                logger.error(f"Failed to reconcile the counters: {err}")
+            await asyncio.sleep(settings.stats_reconcile_interval)
+
+
+counter_reconciler = CounterReconciler()
@@ -0,0 +1,16 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # Seconds between two recounts of the dashboard counters from their tables.
+    stats_reconcile_interval: float = Field(
+        alias="STATS_RECONCILE_INTERVAL", default=3600.0, gt=0
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
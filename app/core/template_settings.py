@@ -0,0 +1,22 @@
+from typing import Literal, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # "development" checks template files for changes on every render, "production"
+    # compiles every template once at startup and never reloads them.
+    template_mode: Literal["development", "production"] = Field(
+        alias="TEMPLATE_MODE", default="development"
+    )
+    # Directory of the compiled template bytecode shared by workers and restarts in
+    # production mode, defaults to a per-user directory in the system temp dir.
+    template_cache_dir: Optional[str] = Field(alias="TEMPLATE_CACHE_DIR", default=None)
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+
+settings = Settings()
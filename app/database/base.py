@@ -1,11 +1,15 @@
 import os
 import sys
+from typing import Any, Dict, Optional
 
 import sqlalchemy
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
+from app.core.database_settings import settings
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 sys.path.append(BASE_DIR)
@@ -15,17 +19,97 @@ class Base(DeclarativeBase):
     metadata: sqlalchemy.MetaData = sqlalchemy.MetaData()  # type: ignore
 
 
-DATABASE_URL = os.environ["DATABASE_URL"]
+def create_engine(
+    database_url: Optional[str] = None, read_only: bool = False
+) -> AsyncEngine:
+    """
+    Creates the async engine for `database_url` (DATABASE_URL by default) with the pool
+    and driver options of the database settings.
+
+    Server databases get a sized queue pool with pre-ping and recycling, and asyncpg its
+    statement cache size. SQLite file databases get the same pool, a busy timeout and
+    the WAL, synchronous=NORMAL and mmap pragmas on every new connection. In-memory
+    SQLite databases keep the single shared connection set up by SQLAlchemy. Foreign
+    keys are enforced on every SQLite database.
+    """
+    url = make_url(database_url or settings.database_url)
+    options: Dict[str, Any] = {"echo": settings.database_echo}
+    connect_args: Dict[str, Any] = {}
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (
+        None,
+        "",
+        ":memory:",
+    )
+    if not in_memory:
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+            pool_recycle=settings.database_pool_recycle,
+            pool_pre_ping=settings.database_pool_pre_ping,
+        )
+    if url.get_backend_name() == "sqlite":
+        connect_args["timeout"] = settings.sqlite_busy_timeout
+    if url.get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = settings.database_statement_cache_size
+        url = url.update_query_dict(
+            {
+                "prepared_statement_cache_size": str(
+                    settings.database_statement_cache_size
+                )
+            }
+        )
+
+    new_engine = create_async_engine(url, connect_args=connect_args, **options)
+
+    if url.get_backend_name() == "sqlite":
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # SQLite ignores the foreign keys, and their ON DELETE actions, by default
+            cursor.execute("PRAGMA foreign_keys=ON")
+            if not in_memory:
+                if settings.sqlite_wal and not read_only:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+                    # Safe with WAL, the commit no longer waits for the file to sync
+                    cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+            cursor.close()
 
+    return new_engine
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def pool_status(pool_engine: Optional[AsyncEngine] = None) -> Dict[str, Any]:
+    """
+    Returns the connection pool statistics of an engine (the app engine by default):
+    its size and the connections currently checked in, checked out and in overflow.
+    """
+    pool = (pool_engine or engine).pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+engine = create_engine()
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+# Without a replica the read sessions are primary sessions
+replica_engine = (
+    create_engine(settings.database_replica_url, read_only=True)
+    if settings.database_replica_url
+    else engine
+)
+replica_session_maker = async_sessionmaker(replica_engine, expire_on_commit=False)
+
 
 def init_models():
     from ..models.groups import Group, Permission, UserGroupLink  # noqa: F401
     from ..models.upload import Upload  # noqa: F401
-    from ..models.users import Role, User, UserActivity  # noqa: F401
+    from ..models.stats import StatCounter  # noqa: F401
+    from ..models.users import Role, User, UserActivity, UserActivityDaily  # noqa: F401
 
 
 # Base = declarative_base()
@@ -1,13 +1,21 @@
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, AsyncGenerator, Optional, Type
 
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from fastapi_users.db import SQLAlchemyUserDatabase
 from fastapi_users.password import PasswordHelper
 from loguru import logger
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.database.base import async_session_maker
+from app.core.database_settings import settings
+from app.core.fragment_cache import data_version, written_within
+from app.database.base import (
+    Base,
+    async_session_maker,
+    engine,
+    replica_engine,
+    replica_session_maker,
+)
 from app.models.users import User
 
 
@@ -46,8 +54,76 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+# Cookie set on the responses to writes, sending the client's reads to the primary
+# until it expires
+READ_PRIMARY_COOKIE = "read_primary"
+
+
+def read_session_maker(request: Request) -> async_sessionmaker[AsyncSession]:
+    """
+    Returns the session maker of the read replica, or of the primary for a client that
+    wrote within the last DATABASE_REPLICA_STICKINESS seconds (read-your-writes).
+    """
+    if settings.database_replica_url and READ_PRIMARY_COOKIE not in request.cookies:
+        return replica_session_maker
+    return async_session_maker
+
+
+async def may_lag(db: AsyncSession, *table_names: str) -> bool:
+    """
+    Whether rows of the tables read with `db` may miss recent writes: the session reads
+    the replica and one of the tables was written within the last
+    DATABASE_REPLICA_STICKINESS seconds, the time the replica is given to catch up.
+    Such reads must not be cached under the current write generations.
+    """
+    if replica_engine is engine or db.get_bind() is not replica_engine.sync_engine:
+        return False
+    for table_name in table_names:
+        if await written_within(table_name, settings.database_replica_stickiness):
+            return True
+    return False
+
+
+async def read_version(db: AsyncSession, *models: Type[Base]) -> Optional[str]:
+    """
+    Returns the `data_version` of the models for the rows read with `db`, or None when
+    they may miss recent writes, so that they are neither cached nor given an ETag.
+    """
+    if await may_lag(db, *(model.__tablename__ for model in models)):
+        return None
+    return await data_version(*models)
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Yields a session from `read_session_maker`.
+    """
+    async with read_session_maker(request)() as session:
+        yield session
+
+
+async def read_primary_after_write(request: Request, call_next) -> Response:
+    """
+    Middleware setting READ_PRIMARY_COOKIE on the successful responses to writes, so
+    that the client reads from the primary until the cookie expires, after
+    DATABASE_REPLICA_STICKINESS seconds. Only registered when a replica is configured.
+    """
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=settings.database_replica_stickiness,
+            httponly=True,
+            secure=request.url.scheme == "https",
+            samesite="lax",
+        )
+    return response
+
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     yield SQLAlchemyUserDatabase(session, User)
 
 
 CurrentAsyncSession = Annotated[AsyncSession, Depends(get_async_session)]
+CurrentReadSession = Annotated[AsyncSession, Depends(get_read_session)]
@@ -1,11 +1,18 @@
 import os
 import uuid
-from typing import Optional
+from typing import Any, Dict, Optional
 
+import jwt
 from dotenv import load_dotenv
 from fastapi import Depends, Request, Response
 from fastapi_csrf_protect import CsrfProtect
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+from fastapi_users import (
+    BaseUserManager,
+    FastAPIUsers,
+    UUIDIDMixin,
+    exceptions,
+    schemas,
+)
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
@@ -15,7 +22,14 @@ from fastapi_users.db import SQLAlchemyUserDatabase
 from fastapi_users.jwt import decode_jwt
 from jwt.exceptions import InvalidTokenError
 from loguru import logger
-
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.activity import activity_logger
+from app.core.cache import cache
+from app.core.cache_settings import settings as cache_settings
+from app.core.fragment_cache import bump_data_version, cascaded_tables
+from app.core.stats import add_to_counter, add_to_counters
 from app.database.db import User, get_user_db
 
 SECRET: str = os.getenv("AUTH_SECRET", "my_default_secret_key")
@@ -30,7 +44,28 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    # fastapi-users commits the user changes, the counters are updated right after
+    async def update(
+        self,
+        user_update: schemas.UU,
+        user: User,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        was_active = user.is_active
+        user = await super().update(user_update, user, safe, request)
+        if user.is_active != was_active:
+            await add_to_counter(
+                self.user_db.session, "active_users", 1 if user.is_active else -1
+            )
+            await self.user_db.session.commit()
+        return user
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
+        await add_to_counters(self.user_db.session, User.__tablename__, [user])
+        await self.user_db.session.commit()
+        await bump_data_version(User.__tablename__)
+        activity_logger.log(user.id, "sign-up")
         print(f"User {user.id} has registered.")
 
     async def on_after_forgot_password(
@@ -43,6 +78,34 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     ):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def on_after_update(
+        self,
+        user: User,
+        update_dict: Dict[str, Any],
+        request: Optional[Request] = None,
+    ):
+        await invalidate_cached_user(user.id)
+        await bump_data_version(User.__tablename__)
+        activity_logger.log(
+            user.id, "account-update", ", ".join(sorted(update_dict)) or None
+        )
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        await invalidate_cached_user(user.id)
+        activity_logger.log(user.id, "verify")
+
+    async def on_after_reset_password(
+        self, user: User, request: Optional[Request] = None
+    ):
+        await invalidate_cached_user(user.id)
+        activity_logger.log(user.id, "password-reset")
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await add_to_counters(self.user_db.session, User.__tablename__, [user], -1)
+        await self.user_db.session.commit()
+        await invalidate_cached_user(user.id)
+        await bump_data_version(User.__tablename__, *cascaded_tables(User))
+
     async def on_after_login(
         self,
         user: User,
@@ -51,6 +114,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     ):
         csrf_protect = CsrfProtect()
         await csrf_protect.validate_csrf(request)
+        activity_logger.log(user.id, "sign-in")
         print(f"User {user.id} logged in.")
 
     # Decoding the JWT token using the inheritance of the BaseUserManager
@@ -78,7 +142,72 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
 cookie_transport = CookieTransport(cookie_max_age=3600)
 
 
+# Columns never copied to the cache, which may be shared with other processes
+UNCACHED_USER_COLUMNS = {"hashed_password"}
+
+
+def _user_cache_key(user_id: uuid.UUID) -> str:
+    return f"user:{user_id}"
+
+
+async def invalidate_cached_user(user_id: uuid.UUID) -> None:
+    """
+    Drops the cached copy of a user, to be called whenever a user row is changed outside
+    of the UserManager (which invalidates on its own update hooks).
+    """
+    await cache.delete(_user_cache_key(user_id))
+
+
+class CachedJWTStrategy(JWTStrategy[User, uuid.UUID]):
+    """
+    JWT strategy serving the users resolved from tokens out of the app cache.
+
+    The token is still decoded and verified on every request, only the user lookup is
+    cached, keyed by the user id so that one invalidation covers all of its tokens. The
+    password hash is left out of the cache. A cached user is returned detached, outside
+    of the identity map of the request session, so that the user rows the request loads
+    itself are never replaced by the cached copy. Adding it to a session (to update it)
+    loads the columns left out.
+    """
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, uuid.UUID]
+    ) -> Optional[User]:
+        if token is None:
+            return None
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+            if data.get("sub") is None:
+                return None
+            user_id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        key = _user_cache_key(user_id)
+        columns = await cache.get(key)
+        if columns is not None:
+            user = User(**columns)
+            make_transient_to_detached(user)
+            return user
+
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        columns = {
+            attr.key: getattr(user, attr.key)
+            for attr in inspect(User).column_attrs
+            if attr.key not in UNCACHED_USER_COLUMNS
+        }
+        await cache.set(key, columns, cache_settings.user_cache_ttl)
+        return user
+
+
 def get_jwt_strategy() -> JWTStrategy:
+    if cache_settings.user_cache_ttl:
+        return CachedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
     return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
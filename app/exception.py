@@ -15,4 +15,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             f"Error in route {method} {route}: {exc.detail} : {exc.status_code}"
         )
         # if route == "/auth/jwt/login" and exc.status_code == 400:
-        return Response(content="Error managed via HTTP module", status_code=400)
+        # The status code is kept so that API clients can tell the errors apart
+        return Response(
+            content="Error managed via HTTP module", status_code=exc.status_code
+        )
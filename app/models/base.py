@@ -4,21 +4,35 @@ from datetime import datetime
 UUID = uuid.uuid4
 
 # from fastapi import Depends
-from sqlalchemy import DateTime
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Index
+from sqlalchemy.orm import Mapped, declared_attr, mapped_column
 from sqlalchemy.sql.functions import func
 
 from app.database.base import Base
 
 
+def keyset_index(table_name: str) -> Index:
+    """
+    Returns the (created, id) index of a table, which the cursor pagination seeks for
+    both its sort order and its tie-breaker.
+    """
+    return Index(f"ix_{table_name}_created_id", "created", "id")
+
+
 class BaseSQLModel(Base):
     # Abstract defined class that is meant to be subclassed
     __abstract__ = True
     # id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    # Leads the (created, id) keyset used for cursor pagination, see keyset_index
     created: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
     updated: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+    # Models with table arguments of their own add keyset_index to them
+    @declared_attr.directive
+    def __table_args__(cls) -> tuple:
+        return (keyset_index(cls.__tablename__),)
@@ -1,4 +1,4 @@
-from sqlalchemy import UUID, Enum, String
+from sqlalchemy import UUID, Enum, Index, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.schema import ForeignKey
 
@@ -27,6 +27,10 @@ class Group(BaseSQLModel):
     )
 
 
+# Group names are unique whatever their case, and looked up case insensitively
+Index("ix_group_group_name_lower", func.lower(Group.group_name), unique=True)
+
+
 # Associated table for the group and user relationship
 class UserGroupLink(BaseSQLModel):
     __tablename__ = "group_users"
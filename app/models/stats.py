@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import BaseSQLModel
+
+
+# Creating a model for the counts shown on the dashboard (users, groups, uploads...),
+# kept up to date on every create and delete instead of being counted on every view
+class StatCounter(BaseSQLModel):
+    __tablename__ = "stat_counters"
+    name: Mapped[str] = mapped_column(String(length=100), unique=True, nullable=False)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -1,20 +1,22 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import List
 
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 
 # from fastapi_users_db_sqlalchemy import GUID
-from sqlalchemy import UUID, DateTime, String
+from sqlalchemy import UUID, Date, DateTime, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.functions import func
 from sqlalchemy.sql.schema import ForeignKey
 
-from app.models.base import Base, BaseSQLModel
+from app.models.base import Base, BaseSQLModel, keyset_index
 from app.models.groups import Group
 from app.models.upload import Upload
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     __tablename__ = "users"
+    __table_args__ = (keyset_index(__tablename__),)
     created: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -23,8 +25,12 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     )
     # add 1 to 1 relationship with the role model keeping default as None
     # Default value on creating user is None and updated later
+    # Indexed to find the users of the roles and profiles matched by a search
     role_id: Mapped[UUID] = mapped_column(
-        ForeignKey("roles.id"), nullable=True, default=None
+        ForeignKey("roles.id", ondelete="SET NULL"),
+        nullable=True,
+        default=None,
+        index=True,
     )
     # Role is defined in quotes to avoid type errors
     role: Mapped["Role"] = relationship(
@@ -33,7 +39,7 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
         back_populates="user",
     )
     profile_id: Mapped[UUID] = mapped_column(
-        ForeignKey("user_profiles.id"), nullable=True, default=None
+        ForeignKey("user_profiles.id"), nullable=True, default=None, index=True
     )
     # Profile 1 to 1 relationship with the user model
     profile: Mapped["UserProfile"] = relationship(
@@ -44,10 +50,14 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     )
     # items: Mapped["Item"] = relationship(back_populates="user", cascade="all, delete")
     # Creating a relationship with the activity model
-    activity: Mapped["UserActivity"] = relationship(
-        "UserActivity", back_populates="user"
+    # The activities are deleted by the database along with the user, without loading
+    activity: Mapped[List["UserActivity"]] = relationship(
+        "UserActivity",
+        back_populates="user",
+        cascade="all, delete",
+        passive_deletes=True,
     )
-    uploads: Mapped["Upload"] = relationship(
+    uploads: Mapped[List["Upload"]] = relationship(
         "Upload",
         back_populates="user",
         cascade="all, delete",
@@ -94,6 +104,14 @@ class UserProfile(BaseSQLModel):
     user: Mapped["User"] = relationship("User", back_populates="profile")
 
 
+# lower() expression indexes backing the case-insensitive prefix search of the users
+Index("ix_users_email_lower", func.lower(User.email))
+Index("ix_user_profiles_first_name_lower", func.lower(UserProfile.first_name))
+Index("ix_user_profiles_last_name_lower", func.lower(UserProfile.last_name))
+Index("ix_user_profiles_company_lower", func.lower(UserProfile.company))
+Index("ix_user_profiles_city_lower", func.lower(UserProfile.city))
+
+
 class Role(BaseSQLModel):
     """
     A Role represents a set of permissions and privileges granted to a user.
@@ -110,7 +128,12 @@ class Role(BaseSQLModel):
     role_desc: Mapped[str | None] = mapped_column(String(length=1024), nullable=True)
 
     # user_id: Mapped[UUID] = mapped_column(GUID, ForeignKey("users.id"))
-    user: Mapped["User"] = relationship("User", back_populates="role")
+    # The users holding the role, whose role_id is cleared when the role is deleted
+    user: Mapped[List["User"]] = relationship("User", back_populates="role")
+
+
+# Role names are unique whatever their case, and looked up case insensitively
+Index("ix_roles_role_name_lower", func.lower(Role.role_name), unique=True)
 
 
 class UserActivity(BaseSQLModel):
@@ -125,9 +148,16 @@ class UserActivity(BaseSQLModel):
     """
 
     __tablename__ = "user_activity"
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), default=None)
+    # The activities of a user are read by date, and the expired ones deleted by date
+    __table_args__ = (
+        keyset_index(__tablename__),
+        Index("ix_user_activity_user_id_activity_date", "user_id", "activity_date"),
+    )
+    user_id: Mapped[UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), default=None
+    )
     activity_date: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=func.now()
+        DateTime(timezone=True), default=func.now(), index=True
     )
     activity_type: Mapped[str] = mapped_column(String(length=200), nullable=False)
     activity_desc: Mapped[str | None] = mapped_column(
@@ -135,3 +165,24 @@ class UserActivity(BaseSQLModel):
     )
     user: Mapped["User"] = relationship("User", back_populates="activity")
     user: Mapped["User"] = relationship("User", back_populates="activity")
+
+
+class UserActivityDaily(BaseSQLModel):
+    """
+    Number of activities of each type per (UTC) day, kept up to date as the activities
+    are recorded and left untouched when they are deleted after the retention horizon.
+
+    Parameters:
+        activity_day (date): The day of the activities.
+        activity_type (str): The type of activity, such as "sign-in" or "sign-up".
+        activity_count (int): The number of activities of the type on the day.
+    """
+
+    __tablename__ = "user_activity_daily"
+    __table_args__ = (
+        keyset_index(__tablename__),
+        UniqueConstraint("activity_day", "activity_type"),
+    )
+    activity_day: Mapped[date] = mapped_column(Date, nullable=False)
+    activity_type: Mapped[str] = mapped_column(String(length=200), nullable=False)
+    activity_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
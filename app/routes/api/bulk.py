@@ -0,0 +1,255 @@
+import asyncio
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, Union
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.routing import APIRouter
+from fastapi_users import exceptions
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import UploadFile
+
+from app.core.activity import activity_logger
+from app.core.import_settings import settings
+from app.database.db import CurrentAsyncSession
+from app.database.security import UserManager, current_active_user, get_user_manager
+from app.models.groups import Group as GroupModelDB
+from app.models.users import Role as RoleModelDB
+from app.models.users import User as UserModelDB
+from app.routes.view.view_crud import SQLAlchemyCRUD
+from app.schema.bulk import ImportResult, RowError
+from app.schema.group import GroupCreate
+from app.schema.users import RoleCreate, UserCreate
+
+role_crud = SQLAlchemyCRUD[RoleModelDB](RoleModelDB)
+group_crud = SQLAlchemyCRUD[GroupModelDB](GroupModelDB)
+user_crud = SQLAlchemyCRUD[UserModelDB](UserModelDB)
+
+# Creating a router for the bulk imports
+bulk_router = APIRouter(prefix="/bulk", tags=["Bulk"])
+
+# Password hashing is CPU bound, so the passwords of a chunk are hashed in parallel on
+# a pool of their own rather than on the (larger) default thread pool
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.import_hash_workers, thread_name_prefix="import-hash"
+)
+
+# Turns the validated rows of a chunk into records, or into an error message per row
+PrepareRecords = Callable[[List[Any]], Awaitable[List[Union[Dict[str, Any], str]]]]
+
+
+async def _read_rows(request: Request) -> List[Any]:
+    """
+    Reads the rows of an import: a JSON array of objects, or a CSV file with a header
+    line sent as the request body (text/csv) or as the `file` field of a form.
+
+    Empty CSV cells are left out so that the schema defaults apply.
+
+    Raises:
+        HTTPException: If the body cannot be read or holds too many rows.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            rows = await request.json()
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+    else:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            file = form.get("file")
+            if not isinstance(file, UploadFile):
+                raise HTTPException(status_code=400, detail="CSV file is missing")
+            content = await file.read()
+        elif content_type.startswith("text/csv"):
+            content = await request.body()
+        else:
+            raise HTTPException(
+                status_code=415, detail="Expected a JSON array or a CSV file"
+            )
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8")
+        rows = [
+            {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and isinstance(value, str) and value.strip()
+            }
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    if len(rows) > settings.import_max_rows:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.import_max_rows} rows can be imported at once",
+        )
+    return rows
+
+
+def _error_messages(error: ValidationError) -> List[str]:
+    messages = []
+    for detail in error.errors(include_url=False, include_input=False):
+        location = ".".join(str(part) for part in detail["loc"])
+        messages.append(f"{location}: {detail['msg']}" if location else detail["msg"])
+    return messages
+
+
+async def _dump_records(items: List[BaseModel]) -> List[Union[Dict[str, Any], str]]:
+    return [item.model_dump() for item in items]
+
+
+async def _import_rows(
+    db: CurrentAsyncSession,
+    rows: List[Any],
+    schema: Type[BaseModel],
+    crud: SQLAlchemyCRUD,
+    unique_column: str,
+    prepare: PrepareRecords = _dump_records,
+) -> ImportResult:
+    """
+    Validates the rows with `schema` and inserts the valid ones, chunk by chunk.
+
+    Every chunk is validated, checked against the stored `unique_column` values with a
+    single query and prepared (e.g. the passwords hashed) before anything is written,
+    so the write transaction is only opened for the multi-row INSERTs. The rejected
+    rows are reported with their errors, and all the accepted ones are committed
+    together.
+
+    Raises:
+        HTTPException: If a row was stored by another request during the import, in
+        which case nothing is imported.
+    """
+    result = ImportResult()
+    seen = set()
+    records = []
+    chunk_size = settings.import_chunk_size
+    for start in range(0, len(rows), chunk_size):
+        items = []
+        for number, row in enumerate(rows[start : start + chunk_size], start=start + 1):
+            try:
+                items.append((number, schema.model_validate(row)))
+            except ValidationError as err:
+                result.errors.append(RowError(row=number, errors=_error_messages(err)))
+
+        existing = await crud.read_existing_values(
+            db,
+            unique_column,
+            [getattr(item, unique_column) for _, item in items],
+        )
+        # The connection is not held while the chunk is prepared
+        await db.close()
+        unique_items = []
+        for number, item in items:
+            value = getattr(item, unique_column)
+            if value.lower() in existing or value.lower() in seen:
+                result.errors.append(
+                    RowError(
+                        row=number,
+                        errors=[f"{unique_column}: {value} already exists"],
+                    )
+                )
+            else:
+                seen.add(value.lower())
+                unique_items.append((number, item))
+
+        prepared = await prepare([item for _, item in unique_items])
+        for (number, _), record in zip(unique_items, prepared):
+            if isinstance(record, str):
+                result.errors.append(RowError(row=number, errors=[record]))
+            else:
+                records.append(record)
+    try:
+        result.created = await crud.create_many(records, db, chunk_size)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Some rows were created by another request, nothing was imported",
+        )
+    result.errors.sort(key=lambda error: error.row)
+    return result
+
+
+# Endpoint for importing roles from a JSON array or a CSV file
+@bulk_router.post("/roles", response_model=ImportResult)
+async def import_roles(
+    request: Request,
+    db: CurrentAsyncSession,
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to import roles")
+    rows = await _read_rows(request)
+    result = await _import_rows(db, rows, RoleCreate, role_crud, "role_name")
+    activity_logger.log(current_user.id, "roles-import", f"{result.created} created")
+    return result
+
+
+# Endpoint for importing groups from a JSON array or a CSV file
+@bulk_router.post("/groups", response_model=ImportResult)
+async def import_groups(
+    request: Request,
+    db: CurrentAsyncSession,
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to import groups")
+    rows = await _read_rows(request)
+    result = await _import_rows(db, rows, GroupCreate, group_crud, "group_name")
+    activity_logger.log(current_user.id, "groups-import", f"{result.created} created")
+    return result
+
+
+# Endpoint for importing users from a JSON array or a CSV file
+@bulk_router.post("/users", response_model=ImportResult)
+async def import_users(
+    request: Request,
+    db: CurrentAsyncSession,
+    user_manager: UserManager = Depends(get_user_manager),
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to import users")
+
+    async def prepare(
+        items: List[UserCreate],
+    ) -> List[Union[Dict[str, Any], str]]:
+        loop = asyncio.get_running_loop()
+        reasons: List[Optional[str]] = []
+        for item in items:
+            try:
+                await user_manager.validate_password(item.password, item)
+                reasons.append(None)
+            except exceptions.InvalidPasswordException as err:
+                reasons.append(f"password: {err.reason}")
+        hashes = iter(
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        hash_executor, user_manager.password_helper.hash, item.password
+                    )
+                    for item, reason in zip(items, reasons)
+                    if reason is None
+                )
+            )
+        )
+        records: List[Union[Dict[str, Any], str]] = []
+        for item, reason in zip(items, reasons):
+            if reason is not None:
+                records.append(reason)
+                continue
+            record = item.model_dump(exclude={"password"})
+            record["hashed_password"] = next(hashes)
+            records.append(record)
+        return records
+
+    rows = await _read_rows(request)
+    result = await _import_rows(db, rows, UserCreate, user_crud, "email", prepare)
+    activity_logger.log(current_user.id, "users-import", f"{result.created} created")
+    return result
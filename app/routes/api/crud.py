@@ -3,11 +3,14 @@ from typing import Generic, Type, TypeVar
 
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import delete, select, update
 
 # from sqlalchemy.orm import Session
+from app.core.fragment_cache import bump_data_version, cascaded_tables
+from app.core.stats import add_to_counters
 from app.database.base import Base
 from app.database.db import CurrentAsyncSession
+from app.routes.view.view_crud import deletes_in_bulk, returning_update_values
 
 ModelType = TypeVar("ModelType", bound=Base)
 PydanticCreateModelType = TypeVar("PydanticCreateModelType", bound=BaseModel)
@@ -33,7 +36,9 @@ class BaseCRUD(Generic[ModelType, PydanticCreateModelType, PydanticUpdateModelTy
     ) -> ModelType:
         db_item = self.db_model(**item.dict())
         db.add(db_item)
+        await add_to_counters(db, self.db_model.__tablename__, [db_item])
         await db.commit()
+        await bump_data_version(self.db_model.__tablename__)
         await db.refresh(db_item)
         return db_item
 
@@ -60,34 +65,69 @@ class BaseCRUD(Generic[ModelType, PydanticCreateModelType, PydanticUpdateModelTy
     async def update(
         self, db: CurrentAsyncSession, id: uuid.UUID, item: PydanticUpdateModelType
     ) -> ModelType | None:
-        stmt = select(self.db_model).where(self.db_model.id == id)
-        query = await db.execute(stmt)
-        if not query:
-            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            for key, value in item.dict().items():
-                setattr(db_item, key, value)
+        data = item.dict()
+        values = returning_update_values(db, self.db_model, data)
+        if values is not None:
+            # UPDATE ... RETURNING writes and reads back the record in one statement
+            stmt = (
+                update(self.db_model)
+                .where(self.db_model.id == id)
+                .values(**values)
+                .returning(self.db_model)
+                .execution_options(populate_existing=True)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
             await db.commit()
-            await db.refresh(db_item)
+            await bump_data_version(self.db_model.__tablename__)
             return db_item
 
+        db_item = await db.get(self.db_model, id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
+        for key, value in data.items():
+            setattr(db_item, key, value)
+        await db.commit()
+        await bump_data_version(self.db_model.__tablename__)
+        await db.refresh(db_item)
+        return db_item
+
     # Adding a database model to delete a record
     async def delete(
         self,
         db: CurrentAsyncSession,
         id: uuid.UUID,
     ):
-        stmt = select(self.db_model).where(self.db_model.id == id)
-        query = await db.execute(stmt)
-        if not query:
-            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            await db.delete(db_item)
+        if deletes_in_bulk(db, self.db_model):
+            stmt = (
+                delete(self.db_model)
+                .where(self.db_model.id == id)
+                .returning(self.db_model)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await add_to_counters(db, self.db_model.__tablename__, [db_item], -1)
             await db.commit()
+            await bump_data_version(self.db_model.__tablename__)
             return db_item
 
+        db_item = await db.get(self.db_model, id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
+        await db.delete(db_item)
+        await add_to_counters(db, self.db_model.__tablename__, [db_item], -1)
+        await db.commit()
+        await bump_data_version(
+            self.db_model.__tablename__, *cascaded_tables(self.db_model)
+        )
+        return db_item
+
     # def delete(self, db: Session, id: int):
     #     db_item = db.query(self.db_model).filter(self.db_model.id == id).first()
     #     if db_item:
@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Literal
+
+from fastapi import Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRouter
+
+from app.database.db import read_session_maker
+from app.database.security import current_active_user
+from app.models.groups import Group as GroupModelDB
+from app.models.upload import Upload as UploadsModelDB
+from app.models.users import Role as RoleModelDB
+from app.models.users import User as UserModelDB
+from app.models.users import UserProfile as UserProfileModelDB
+from app.routes.view.view_crud import SQLAlchemyCRUD
+
+user_crud = SQLAlchemyCRUD[UserModelDB](
+    UserModelDB,
+    related_models={RoleModelDB: "role", UserProfileModelDB: "profile"},
+)
+group_crud = SQLAlchemyCRUD[GroupModelDB](GroupModelDB)
+upload_crud = SQLAlchemyCRUD[UploadsModelDB](
+    UploadsModelDB, related_models={UserModelDB: "user"}
+)
+
+# Creating a router for the exports
+export_router = APIRouter(prefix="/export", tags=["Export"])
+
+# Rows fetched from the database, and written to the response, at once
+EXPORT_BATCH_SIZE = 1000
+
+# Exported fields, as the output name mapped to the attribute path on the record
+USER_FIELDS = {
+    "id": "id",
+    "email": "email",
+    "is_active": "is_active",
+    "is_superuser": "is_superuser",
+    "is_verified": "is_verified",
+    "created": "created",
+    "updated": "updated",
+    "role_name": "role.role_name",
+    "first_name": "profile.first_name",
+    "last_name": "profile.last_name",
+    "gender": "profile.gender",
+    "date_of_birth": "profile.date_of_birth",
+    "city": "profile.city",
+    "country": "profile.country",
+    "address": "profile.address",
+    "phone": "profile.phone",
+    "company": "profile.company",
+}
+GROUP_FIELDS = {
+    "id": "id",
+    "group_name": "group_name",
+    "group_desc": "group_desc",
+    "created": "created",
+    "updated": "updated",
+}
+UPLOAD_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "unique_name": "unique_name",
+    "file_type": "file_type",
+    "source": "source",
+    "file_size": "file_size",
+    "user_email": "user.email",
+    "created": "created",
+    "updated": "updated",
+}
+
+ExportFormat = Literal["csv", "ndjson"]
+
+
+def _field_value(record: Any, path: str) -> Any:
+    """
+    Reads a dotted attribute path from a record, None when a relationship is empty.
+    UUIDs, datetimes and enums are converted to their JSON representation.
+    """
+    value = record
+    for attribute in path.split("."):
+        if value is None:
+            return None
+        value = getattr(value, attribute)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+async def _export_lines(
+    request: Request,
+    crud: SQLAlchemyCRUD,
+    fields: Dict[str, str],
+    export_format: ExportFormat,
+) -> AsyncIterator[str]:
+    """
+    Streams all the records of `crud` as CSV (with a header line) or NDJSON, one batch
+    of lines at a time.
+
+    The response body is sent after the request dependencies are closed, so the export
+    opens its own session, on the replica when one can serve the client.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(fields)
+    rows = 0
+    async with read_session_maker(request)() as db:
+        async for record in crud.stream_all(
+            db,
+            join_relationships=bool(crud.related_models),
+            columns=list(fields.values()),
+            batch_size=EXPORT_BATCH_SIZE,
+        ):
+            values = {name: _field_value(record, path) for name, path in fields.items()}
+            if export_format == "csv":
+                writer.writerow(values.values())
+            else:
+                buffer.write(json.dumps(values, default=str) + "\n")
+            rows += 1
+            if rows % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _export_response(
+    request: Request,
+    crud: SQLAlchemyCRUD,
+    fields: Dict[str, str],
+    export_format: ExportFormat,
+    name: str,
+) -> StreamingResponse:
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_lines(request, crud, fields, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={name}.{export_format}"},
+    )
+
+
+# Endpoint for exporting the users with their role and profile
+@export_router.get("/users")
+async def export_users(
+    request: Request,
+    export_format: ExportFormat = Query("csv", alias="format"),
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to export users")
+    return _export_response(request, user_crud, USER_FIELDS, export_format, "users")
+
+
+# Endpoint for exporting the groups
+@export_router.get("/groups")
+async def export_groups(
+    request: Request,
+    export_format: ExportFormat = Query("csv", alias="format"),
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to export groups")
+    return _export_response(request, group_crud, GROUP_FIELDS, export_format, "groups")
+
+
+# Endpoint for exporting the uploaded files records
+@export_router.get("/uploads")
+async def export_uploads(
+    request: Request,
+    export_format: ExportFormat = Query("csv", alias="format"),
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to export files")
+    return _export_response(
+        request, upload_crud, UPLOAD_FIELDS, export_format, "uploads"
+    )
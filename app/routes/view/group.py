@@ -1,15 +1,24 @@
 import json
 import uuid
+from typing import Optional
 from urllib.parse import parse_qs, unquote_plus
 
 import nh3
-from fastapi import Depends, HTTPException, Request, Response
+from fastapi import Depends, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
 from fastapi_csrf_protect import CsrfProtect
 from sqlalchemy import select
 
-from app.database.db import CurrentAsyncSession
+from app.core.activity import activity_logger
+from app.core.fragment_cache import (
+    is_not_modified,
+    not_modified,
+    page_etag,
+    render_fragment,
+    validation_headers,
+)
+from app.database.db import CurrentAsyncSession, CurrentReadSession, read_version
 from app.database.security import current_active_user
 from app.models.groups import Group as GroupModelDB
 from app.models.groups import UserGroupLink as UserGroupLinkModelDB
@@ -19,29 +28,36 @@ from app.models.users import UserProfile as UserProfileModelDB
 from app.routes.view.errors import handle_error
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.schema.group import GroupCreate
-from app.schema.group import GroupUserLink as GroupUserLinkCreate
 from app.templates import templates
 
 group_view_route = APIRouter()
 
 
+# Group members are a collection, loaded with a separate SELECT ... IN query
+# rather than a JOIN that would repeat every group row once per member
 group_crud = SQLAlchemyCRUD[GroupModelDB](
-    GroupModelDB, related_models={UserModelDB: "users"}
+    GroupModelDB,
+    related_models={UserModelDB: "users"},
+    load_strategies={"users": "selectin"},
 )
 user_crud = SQLAlchemyCRUD[UserModelDB](
     UserModelDB,
     related_models={UserProfileModelDB: "profile", UserRoleModelDB: "role"},
 )
+group_user_crud = SQLAlchemyCRUD[UserGroupLinkModelDB](UserGroupLinkModelDB)
 
 
 # Defining a route to navigate to the group page
 @group_view_route.get("/groups", response_class=HTMLResponse)
 async def get_groups(
     request: Request,
-    db: CurrentAsyncSession,
+    db: CurrentReadSession,
     current_user: UserModelDB = Depends(current_active_user),
-    skip: int = 0,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    page_number: int = Query(1, alias="page", ge=1),
     limit: int = 100,
+    rows: str = "groups",
     csrf_protect: CsrfProtect = Depends(),
 ):
     try:
@@ -49,8 +65,59 @@ async def get_groups(
             raise HTTPException(
                 status_code=403, detail="Not authorized to view this page"
             )
-        # Access the cookies using the Request object
-        groups = await group_crud.read_all(db, skip, limit, join_relationships=True)
+        # Only the fields rendered by the group tables
+        columns = ["group_name", "group_desc", "users.id"]
+        version = await read_version(db, GroupModelDB, UserGroupLinkModelDB)
+
+        # Next page requested by the "load more" row of the allocation table
+        if rows == "allocation" and cursor and request.headers.get("HX-Request"):
+
+            async def load_groups():
+                page = await group_crud.read_page(
+                    db,
+                    cursor=cursor,
+                    limit=limit,
+                    join_relationships=True,
+                    columns=columns,
+                )
+                return {"groups": page.items, "next_cursor": page.next_cursor}
+
+            return await render_fragment(
+                request,
+                "partials/group/group_allocation_rows.html",
+                version,
+                {
+                    "cursor": cursor,
+                    "limit": limit,
+                    "csrf_token": request.headers.get("X-CSRF-Token"),
+                },
+                load_groups,
+            )
+
+        # The page is answered with 304 while the groups, the user and the CSRF cookie
+        # the browser holds are unchanged, without querying the rows or rendering
+        page_context = {
+            "user_id": current_user.id,
+            "cursor": cursor,
+            "before": before,
+            "page": page_number,
+            "limit": limit,
+        }
+        csrf_cookie = request.cookies.get(csrf_protect._cookie_key)
+        etag = page_etag("pages/groups.html", version, page_context, csrf_cookie)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        # The page after `cursor`, or before `before`, with the total number of groups
+        page = await group_crud.read_page(
+            db,
+            cursor=before or cursor,
+            limit=limit,
+            backwards=before is not None,
+            join_relationships=True,
+            columns=columns,
+            with_total=True,
+        )
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -58,10 +125,17 @@ async def get_groups(
             "pages/groups.html",
             {
                 "request": request,
-                "groups": groups,
+                "groups": page.items,
+                "next_cursor": page.next_cursor,
+                "page": page,
+                "page_number": page_number,
+                "limit": limit,
                 "user_type": current_user.is_superuser,
                 "csrf_token": csrf_token,
             },
+            headers=validation_headers(
+                page_etag("pages/groups.html", version, page_context, signed_token)
+            ),
         )
 
         csrf_protect.set_csrf_cookie(signed_token, response)
@@ -175,13 +249,10 @@ async def post_create_group(
             group_desc=nh3.clean(str(form.get("group_desc"))),
         )
 
-        existing_group = await group_crud.read_by_column(
-            db, "group_name", group_create.group_name
-        )
-
-        if existing_group:
+        # The name check and the insert are a single statement, see create_if_absent
+        if await group_crud.create_if_absent(dict(group_create), db) is None:
             raise HTTPException(status_code=400, detail="Group name already exists")
-        await group_crud.create(dict(group_create), db)
+        activity_logger.log(current_user.id, "group-create", group_create.group_name)
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -249,6 +320,7 @@ async def post_update_group(
         )
 
         await group_crud.update(db, group_id, dict(group_update))
+        activity_logger.log(current_user.id, "group-update", group_update.group_name)
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -311,6 +383,7 @@ async def delete_group(
         if not current_user.is_superuser:
             raise HTTPException(status_code=403, detail="Not authorized to add groups")
         await group_crud.delete(db, group_id)
+        activity_logger.log(current_user.id, "group-delete", str(group_id))
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -362,26 +435,41 @@ async def get_group_users(
     # checking the current user as super user
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to add groups")
-    group = await group_crud.read_by_primary_key(db, group_id)
-    users = await user_crud.read_all(db, join_relationships=True)
-    group_users = await db.execute(
-        select(UserGroupLinkModelDB).where(UserGroupLinkModelDB.group_id == group_id)
-    )
-    group_users = group_users.unique().scalars().all()
-    await db.close()
-    group_user_ids = [user.user_id for user in group_users]
 
-    csrf_token = request.headers.get("X-CSRF-Token")
-    return templates.TemplateResponse(
+    async def load_group_users():
+        group = await group_crud.read_by_primary_key(db, group_id)
+        users = await user_crud.read_all(
+            db,
+            join_relationships=True,
+            columns=["profile.first_name", "profile.last_name", "role.role_name"],
+        )
+        group_users = await db.execute(
+            select(UserGroupLinkModelDB).where(
+                UserGroupLinkModelDB.group_id == group_id
+            )
+        )
+        group_users = group_users.unique().scalars().all()
+        await db.close()
+        group_user_ids = [user.user_id for user in group_users]
+        return {"group": group, "users": users, "group_user_ids": group_user_ids}
+
+    return await render_fragment(
+        request,
         "partials/group/add_group_user.html",
+        await read_version(
+            db,
+            GroupModelDB,
+            UserModelDB,
+            UserProfileModelDB,
+            UserRoleModelDB,
+            UserGroupLinkModelDB,
+        ),
         {
-            "request": request,
-            "group": group,
-            "users": users,
-            "group_user_ids": group_user_ids,
-            "csrf_token": csrf_token,
+            "group_id": group_id,
+            "csrf_token": request.headers.get("X-CSRF-Token"),
             "user_type": current_user.is_superuser,
         },
+        load_group_users,
     )
 
 
@@ -403,49 +491,23 @@ async def post_group_user_link(
             raise HTTPException(status_code=403, detail="Not authorized to add groups")
         form = await request.form()
 
-        all_users = set(form.getlist("all_users"))
-        selected_users = set(form.getlist("users_selected"))
-
-        # Removing the users already selected from the list of all users
-        non_selected_users = all_users - selected_users
-        db_data = []
-        for user_id in form.getlist("users_selected"):
-            group_user_link = GroupUserLinkCreate(
-                group_id=uuid.UUID(nh3.clean(str(group_id))),
-                user_id=uuid.UUID(nh3.clean(str(user_id))),
-            )
-            group_id = group_user_link.group_id
-            user_id = group_user_link.user_id
-            existing_record = await db.scalar(
-                select(UserGroupLinkModelDB).filter_by(
-                    group_id=group_id, user_id=user_id
-                )
-            )
-            if existing_record:
-                print(f"Record with {user_id} already exists")
-            else:
-                db_data.append(
-                    group_user_link.model_dump(exclude={"id"}, exclude_unset=True)
-                )
-        for user_id in non_selected_users:
-            group_user_link = GroupUserLinkCreate(
-                group_id=uuid.UUID(nh3.clean(str(group_id))),
-                user_id=uuid.UUID(nh3.clean(str(user_id))),
-            )
-            group_id = group_user_link.group_id
-            user_id = group_user_link.user_id
-            existing_record = await db.scalar(
-                select(UserGroupLinkModelDB).filter_by(
-                    group_id=group_id, user_id=user_id
-                )
-            )
-            if existing_record:
-                await db.delete(existing_record)
-                await db.commit()
+        # Users listed on the form and the ones ticked among them
+        all_users = {uuid.UUID(nh3.clean(str(id))) for id in form.getlist("all_users")}
+        selected_users = {
+            uuid.UUID(nh3.clean(str(id))) for id in form.getlist("users_selected")
+        }
 
-        if len(db_data) > 0:
-            db.add_all([UserGroupLinkModelDB(**link) for link in db_data])
-            await db.commit()
+        # Links missing for selected users are inserted and links of the listed but
+        # non selected users are removed, in one transaction
+        await group_user_crud.sync_links(
+            db,
+            "group_id",
+            group_id,
+            "user_id",
+            selected_users,
+            scope_ids=all_users,
+        )
+        activity_logger.log(current_user.id, "group-users", str(group_id))
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -1,10 +1,17 @@
-from fastapi import Depends, Request
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.routing import APIRouter
 from fastapi_csrf_protect import CsrfProtect
+from sqlalchemy import select
 
+from app.core.fragment_cache import render_fragment
+from app.core.stats import counters_version, read_counters
+from app.database.db import CurrentReadSession, read_version
 from app.database.security import current_active_user, verify_jwt
 from app.models.users import User as UserModelDB
+from app.models.users import UserActivityDaily
 from app.templates import templates
 
 # Create an APIRouter
@@ -38,6 +45,68 @@ async def get_dashboard(
     return response
 
 
+# Defining a route for the activity counts of the last days shown on the dashboard
+@login_view_route.get("/dashboard/activity", response_class=HTMLResponse)
+async def get_dashboard_activity(
+    request: Request,
+    db: CurrentReadSession,
+    days: int = Query(7, ge=1, le=90),
+    user: UserModelDB = Depends(current_active_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view activity")
+    # The counts are read from the daily rollups, never from the activities themselves
+    today = datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days - 1)
+
+    async def load_activity():
+        query = await db.execute(
+            select(
+                UserActivityDaily.activity_day,
+                UserActivityDaily.activity_type,
+                UserActivityDaily.activity_count,
+            ).where(UserActivityDaily.activity_day >= since)
+        )
+        counts = {}
+        for day, activity_type, count in query.all():
+            counts.setdefault(day, {})[activity_type] = count
+        activity_days = [today - timedelta(days=offset) for offset in range(days)]
+        return {
+            "activity_types": sorted({key for day in counts.values() for key in day}),
+            "activity_days": [(day, counts.get(day, {})) for day in activity_days],
+        }
+
+    return await render_fragment(
+        request,
+        "partials/dashboard/activity_summary.html",
+        await read_version(db, UserActivityDaily),
+        {"since": since, "days": days},
+        load_activity,
+    )
+
+
+# Defining a route for the counts shown on the dashboard, read from their counters
+@login_view_route.get("/dashboard/stats", response_class=HTMLResponse)
+async def get_dashboard_stats(
+    request: Request,
+    db: CurrentReadSession,
+    user: UserModelDB = Depends(current_active_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view stats")
+
+    async def load_stats():
+        return {"stats": await read_counters(db)}
+
+    return await render_fragment(
+        request,
+        "partials/dashboard/stats.html",
+        await counters_version(db),
+        {},
+        load_stats,
+    )
+
+
 @login_view_route.get("/")
 async def get_index(request: Request, csrf_protect: CsrfProtect = Depends()):
     cookies = request.cookies
@@ -1,14 +1,22 @@
 # importing the required modules
 import json
 import uuid
+from typing import Optional
 
 import nh3
-from fastapi import Depends, HTTPException, Request, Response
+from fastapi import Depends, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
 from fastapi_csrf_protect import CsrfProtect
 
-from app.database.db import CurrentAsyncSession
+from app.core.activity import activity_logger
+from app.core.fragment_cache import (
+    is_not_modified,
+    not_modified,
+    page_etag,
+    validation_headers,
+)
+from app.database.db import CurrentAsyncSession, CurrentReadSession, read_version
 from app.database.security import current_active_user
 from app.models.users import Role as RoleModelDB
 from app.models.users import User as UserModelDB
@@ -27,9 +35,11 @@ role_crud = SQLAlchemyCRUD[RoleModelDB](RoleModelDB)
 @role_view_route.get("/role", response_class=HTMLResponse)
 async def get_role(
     request: Request,
-    db: CurrentAsyncSession,
+    db: CurrentReadSession,
     current_user: UserModelDB = Depends(current_active_user),
-    skip: int = 0,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    page_number: int = Query(1, alias="page", ge=1),
     limit: int = 100,
     csrf_protect: CsrfProtect = Depends(),
 ):
@@ -38,17 +48,45 @@ async def get_role(
             raise HTTPException(
                 status_code=403, detail="Not authorized to view this page"
             )
-        # Access the cookies using the Request object
-        roles = await role_crud.read_all(db, skip, limit)
+        # The page is answered with 304 while the roles, the user and the CSRF cookie
+        # the browser holds are unchanged, without querying the rows or rendering
+        version = await read_version(db, RoleModelDB)
+        page_context = {
+            "user_id": current_user.id,
+            "cursor": cursor,
+            "before": before,
+            "page": page_number,
+            "limit": limit,
+        }
+        csrf_cookie = request.cookies.get(csrf_protect._cookie_key)
+        etag = page_etag("pages/role.html", version, page_context, csrf_cookie)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        # The page after `cursor`, or before `before`, with the total number of roles
+        page = await role_crud.read_page(
+            db,
+            cursor=before or cursor,
+            limit=limit,
+            backwards=before is not None,
+            with_total=True,
+        )
+
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
         response = templates.TemplateResponse(
             "pages/role.html",
             {
                 "request": request,
-                "roles": roles,
+                "roles": page.items,
+                "page": page,
+                "page_number": page_number,
+                "limit": limit,
                 "user_type": current_user.is_superuser,
                 "csrf_token": csrf_token,
             },
+            headers=validation_headers(
+                page_etag("pages/role.html", version, page_context, signed_token)
+            ),
         )
         csrf_protect.set_csrf_cookie(signed_token, response)
         return response
@@ -106,7 +144,6 @@ async def post_create_roles(
     csrf_protect: CsrfProtect = Depends(),
 ):
     try:
-
         await csrf_protect.validate_csrf(request)
         # checking the current user as super user
         if not current_user.is_superuser:
@@ -120,13 +157,10 @@ async def post_create_roles(
             role_desc=nh3.clean(str(form.get("role_desc"))),
         )
 
-        existing_role = await role_crud.read_by_column(
-            db, "role_name", role_create.role_name
-        )
-
-        if existing_role:
+        # The name check and the insert are a single statement, see create_if_absent
+        if await role_crud.create_if_absent(dict(role_create), db) is None:
             raise HTTPException(status_code=400, detail="Role name already exists")
-        await role_crud.create(dict(role_create), db)
+        activity_logger.log(current_user.id, "role-create", role_create.role_name)
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -232,6 +266,7 @@ async def post_update_role(
         )
 
         await role_crud.update(db, role_id, dict(role_update))
+        activity_logger.log(current_user.id, "role-update", role_update.role_name)
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
         # Redirecting to the add role page upon successful role creation
@@ -283,6 +318,7 @@ async def delete_role(
                 status_code=403, detail="Not authorized to delete roles"
             )
         await role_crud.delete(db, role_id)
+        activity_logger.log(current_user.id, "role-delete", str(role_id))
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
         role_name = request.headers.get("X-Role-Name")
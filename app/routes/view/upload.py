@@ -1,15 +1,28 @@
 import json
 import uuid
+from typing import Optional, Tuple
 from urllib.parse import parse_qs, unquote_plus
 
+import jwt
 import nh3
 from fastapi import Depends, File, HTTPException, Request, UploadFile
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.routing import APIRouter
+from fastapi_users.jwt import decode_jwt, generate_jwt
+from pydantic import ValidationError
 
+from app.core.activity import activity_logger
+from app.core.fragment_cache import render_fragment
 from app.core.minio_core import minio
-from app.database.db import CurrentAsyncSession
-from app.database.security import current_active_user
+from app.core.minio_settings import settings as minio_settings
+from app.database.db import CurrentAsyncSession, CurrentReadSession, read_version
+from app.database.security import SECRET, current_active_user
 from app.models.upload import Upload as UploadsModelDB
 from app.models.users import User as UserModelDB
 from app.routes.view.errors import handle_error
@@ -20,6 +33,9 @@ from app.templates import templates
 upload_crud = SQLAlchemyCRUD[UploadsModelDB](UploadsModelDB)
 upload_view_route = APIRouter()
 
+# Audience of the tokens binding a presigned upload to the user it was issued to
+UPLOAD_TOKEN_AUDIENCE = "fastapi-htmx:presigned-upload"
+
 
 @upload_view_route.get("/uploads", response_class=HTMLResponse)
 async def get_upload_file(
@@ -36,6 +52,7 @@ async def get_upload_file(
                 "request": request,
                 "current_user": current_user,
                 "user_type": current_user.is_superuser,
+                "direct_transfer": minio_settings.minio_direct_transfer,
             },
         )
     except Exception as e:
@@ -50,6 +67,68 @@ async def get_upload_file(
         )
 
 
+@upload_view_route.get("/uploads/stats")
+async def get_upload_stats(
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view stats")
+    return minio.stats()
+
+
+def _unique_name(filename: str) -> str:
+    file_extension = filename.split(".")[-1]
+    return f"{uuid.uuid4()}.{file_extension}"
+
+
+def _upload_token(unique_name: str, user: UserModelDB) -> str:
+    # The upload may still be running when its presigned URL expires
+    lifetime = (
+        minio_settings.minio_presigned_expiry + minio_settings.minio_transfer_timeout
+    )
+    return generate_jwt(
+        {
+            "sub": str(user.id),
+            "unique_name": unique_name,
+            "aud": UPLOAD_TOKEN_AUDIENCE,
+        },
+        SECRET,
+        int(lifetime),
+    )
+
+
+def _uploaded_name(token: str, user: UserModelDB) -> str:
+    """
+    Returns the name of the object a presigned upload token was issued for.
+
+    Raises:
+        HTTPException: If the token is invalid, expired or was issued to another user,
+        with a 403 Forbidden status code.
+    """
+    try:
+        payload = decode_jwt(token, SECRET, [UPLOAD_TOKEN_AUDIENCE])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=403, detail="Invalid upload token")
+    if payload.get("sub") != str(user.id):
+        raise HTTPException(status_code=403, detail="Invalid upload token")
+    return payload["unique_name"]
+
+
+def _upload_added_headers(message: str) -> dict:
+    return {
+        "HX-Trigger": json.dumps(
+            {
+                "showAlert": {
+                    "type": "added",
+                    "message": message,
+                    "source": "upload-page",
+                },
+                "refreshUploadTable": "",
+            }
+        ),
+    }
+
+
 @upload_view_route.post("/post_upload_file", response_class=HTMLResponse)
 async def post_upload_file(
     request: Request,
@@ -65,8 +144,7 @@ async def post_upload_file(
 
         if file.filename is None:
             raise HTTPException(status_code=400, detail="Filename is missing")
-        file_extension = file.filename.split(".")[-1]
-        unique_name = f"{uuid.uuid4()}.{file_extension}"
+        unique_name = _unique_name(file.filename)
 
         file_url = await minio.upload_file(file, unique_name)
         if file_url.startswith("Error occurred:"):
@@ -84,19 +162,79 @@ async def post_upload_file(
         )
 
         await upload_crud.create(dict(file_create), db)
+        activity_logger.log(current_user.id, "file-upload", file_create.name)
 
-        headers = {
-            "HX-Trigger": json.dumps(
-                {
-                    "showAlert": {
-                        "type": "added",
-                        "message": f"{file.filename} uploaded successfully. URL: {file_url}",
-                        "source": "upload-page",
-                    },
-                    "refreshUploadTable": "",
-                }
-            ),
-        }
+        headers = _upload_added_headers(
+            f"{file.filename} uploaded successfully. URL: {file_url}"
+        )
+        return HTMLResponse(content="", headers=headers)
+    except Exception as e:
+        return handle_error("pages/upload.html", {"request": request}, e)
+
+
+# Route handing out a presigned URL the browser uploads the file to directly
+@upload_view_route.post("/post_presigned_upload")
+async def post_presigned_upload(
+    request: Request,
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to upload files")
+    form = await request.form()
+    filename = str(form.get("filename") or "")
+    if not filename:
+        return JSONResponse({"detail": "Filename is missing"}, status_code=400)
+
+    unique_name = _unique_name(filename)
+    upload_url = await minio.presigned_upload_url(unique_name)
+    if upload_url.startswith("Error occurred:"):
+        return JSONResponse({"detail": upload_url}, status_code=500)
+    return {
+        "upload_url": upload_url,
+        "unique_name": unique_name,
+        "upload_token": _upload_token(unique_name, current_user),
+    }
+
+
+# Route called once the browser has uploaded a file through a presigned URL
+@upload_view_route.post("/post_upload_complete", response_class=HTMLResponse)
+async def post_upload_complete(
+    request: Request,
+    db: CurrentAsyncSession,
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to upload files")
+    form = await request.form()
+    # Only the names handed out to the user by post_presigned_upload can be recorded
+    unique_name = _uploaded_name(str(form.get("upload_token") or ""), current_user)
+    try:
+        # The size and type are taken from the stored object, not from the browser
+        file_stat = await minio.stat_file(unique_name)
+        if isinstance(file_stat, str):
+            raise HTTPException(status_code=400, detail=file_stat)
+        try:
+            file_create = FileCreate(
+                name=nh3.clean(str(form.get("name"))),
+                unique_name=unique_name,
+                file_type=nh3.clean(
+                    file_stat.content_type or "application/octet-stream"
+                ),
+                source=nh3.clean(str(form.get("source"))),
+                file_size=file_stat.size,
+                user_id=current_user.id,
+            )
+        except ValidationError:
+            # A rejected file is never recorded, so it is not kept in the bucket either
+            await minio.remove_file(unique_name)
+            raise
+
+        # A repeated completion request finds the file already recorded
+        if await upload_crud.create_if_absent(dict(file_create), db) is None:
+            return HTMLResponse(content="", status_code=409)
+        activity_logger.log(current_user.id, "file-upload", file_create.name)
+
+        headers = _upload_added_headers(f"{file_create.name} uploaded successfully.")
         return HTMLResponse(content="", headers=headers)
     except Exception as e:
         return handle_error("pages/upload.html", {"request": request}, e)
@@ -106,7 +244,7 @@ async def post_upload_file(
 @upload_view_route.get("/get_uploaded_files", response_class=HTMLResponse)
 async def get_uploaded_files(
     request: Request,
-    db: CurrentAsyncSession,
+    db: CurrentReadSession,
     current_user: UserModelDB = Depends(current_active_user),
     skip: int = 0,
     limit: int = 100,
@@ -114,20 +252,31 @@ async def get_uploaded_files(
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to view files")
     try:
-        files = await upload_crud.read_by_column(
-            db, "user_id", current_user.id, skip, limit
-        )
-        # Check if files is iterable
-        if not hasattr(files, "__iter__"):
-            files = [files]
-        return templates.TemplateResponse(
+
+        async def load_files():
+            files = await upload_crud.read_by_column(
+                db, "user_id", current_user.id, skip, limit
+            )
+            # Check if files is iterable
+            if files is None:
+                files = []
+            elif not hasattr(files, "__iter__"):
+                files = [files]
+            return {"files": files, "current_user": current_user}
+
+        # The table is polled after every upload and delete, so it is served from the
+        # fragment cache until the uploads change
+        return await render_fragment(
+            request,
             "partials/upload/files_table.html",
+            await read_version(db, UploadsModelDB),
             {
-                "request": request,
-                "files": files,
-                "current_user": current_user,
+                "user_id": current_user.id,
                 "user_type": current_user.is_superuser,
+                "skip": skip,
+                "limit": limit,
             },
+            load_files,
         )
     except Exception as e:
         return handle_error(
@@ -141,6 +290,35 @@ async def get_uploaded_files(
         )
 
 
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single `bytes` range of a Range header into inclusive (start, end) offsets.
+
+    Returns None for malformed or multiple ranges, answered with the whole file.
+
+    Raises:
+        ValueError: If the range cannot be satisfied for a file of `size` bytes.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep or not (first + last).isdigit():
+        return None
+    if not first:
+        # Suffix range, the last `last` bytes of the file
+        if int(last) == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > int(last or start):
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
 # Route to download a file from the back end
 @upload_view_route.get("/download/{file_unique_name}")
 async def download_file(
@@ -152,15 +330,64 @@ async def download_file(
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to download files")
     try:
+        if minio_settings.minio_direct_transfer:
+            download_url = await minio.presigned_download_url(
+                file_unique_name, file_unique_name
+            )
+            if download_url.startswith("Error occurred:"):
+                raise HTTPException(status_code=500, detail=download_url)
+            return RedirectResponse(download_url, status_code=307)
+
+        file_stat = await minio.stat_file(file_unique_name)
+        if isinstance(file_stat, str):
+            raise HTTPException(status_code=500, detail=file_stat)
+
+        etag = f'"{file_stat.etag}"'
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Content-Disposition": f"attachment; filename={file_unique_name}",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag
+            in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        ):
+            return Response(status_code=304, headers=headers)
 
-        file_response = await minio.get_file(file_unique_name)
+        byte_range = None
+        range_header = request.headers.get("range")
+        # A Range conditioned on an outdated ETag gets the whole, new file
+        if range_header and request.headers.get("if-range", etag) == etag:
+            try:
+                byte_range = _parse_range(range_header, file_stat.size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={**headers, "Content-Range": f"bytes */{file_stat.size}"},
+                )
 
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_stat.size}"
+            file_response = await minio.get_file(
+                file_unique_name, offset=start, length=end - start + 1, etag=etag
+            )
+        else:
+            start, end = 0, file_stat.size - 1
+            status_code = 200
+            file_response = await minio.get_file(file_unique_name, etag=etag)
         if isinstance(file_response, str):
             raise HTTPException(status_code=500, detail=file_response)
+        headers["Content-Length"] = str(end - start + 1)
+
         return StreamingResponse(
-            file_response,
-            media_type="application/octet-stream",
-            headers={"Content-Disposition": f"attachment; filename={file_unique_name}"},
+            minio.iter_file(file_response),
+            status_code=status_code,
+            media_type=file_stat.content_type or "application/octet-stream",
+            headers=headers,
         )
     except Exception as e:
         return handle_error(
@@ -179,7 +406,6 @@ async def delete_file(
     current_user: UserModelDB = Depends(current_active_user),
     response=HTMLResponse,
 ):
-
     try:
         if not current_user.is_superuser:
             raise HTTPException(
@@ -196,6 +422,7 @@ async def delete_file(
         if file_response.startswith("Error occurred:"):
             raise HTTPException(status_code=500, detail=file_response)
         await upload_crud.delete(db, file_id)
+        activity_logger.log(current_user.id, "file-delete", file_unique_name)
         headers = {
             "HX-Trigger": json.dumps(
                 {
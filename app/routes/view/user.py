@@ -1,21 +1,33 @@
 # importing the required modules
 import json
+import sys
 import uuid
 from datetime import datetime
+from typing import Optional
 
 import nh3
-from fastapi import Depends, HTTPException, Request, Response
+from fastapi import Depends, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
 from fastapi_csrf_protect import CsrfProtect
-
-from app.database.db import CurrentAsyncSession
-from app.database.security import current_active_user
+from sqlalchemy import ColumnElement, and_, func, or_, select, union
+
+from app.core.activity import activity_logger
+from app.core.fragment_cache import (
+    is_not_modified,
+    not_modified,
+    page_etag,
+    render_fragment,
+    validation_headers,
+)
+from app.core.reference_cache import ReferenceRoles, reference_rows
+from app.database.db import CurrentAsyncSession, CurrentReadSession, read_version
+from app.database.security import current_active_user, invalidate_cached_user
 from app.models.users import Role as RoleModelDB
 from app.models.users import User as UserModelDB
 from app.models.users import UserProfile as UserProfileModelDB
 from app.routes.view.errors import handle_error
-from app.routes.view.view_crud import SQLAlchemyCRUD
+from app.routes.view.view_crud import SQLAlchemyCRUD, unit_of_work
 from app.schema.users import ProfileUpdate
 
 # from app.schema.users import RoleCreate
@@ -30,14 +42,27 @@ user_crud = SQLAlchemyCRUD[UserModelDB](
 )
 user_profile_crud = SQLAlchemyCRUD[UserProfileModelDB](UserProfileModelDB)
 
-role_crud = SQLAlchemyCRUD[RoleModelDB](RoleModelDB)
+# Only the fields rendered by the user table
+USER_TABLE_COLUMNS = [
+    "email",
+    "is_active",
+    "is_superuser",
+    "role.role_name",
+    "profile.first_name",
+    "profile.last_name",
+    "profile.phone",
+    "profile.date_of_birth",
+    "profile.company",
+]
 
 
 @user_view_route.get("/user", response_class=HTMLResponse)
 async def get_users(
     request: Request,
-    db: CurrentAsyncSession,
-    skip: int = 0,
+    db: CurrentReadSession,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    page_number: int = Query(1, alias="page", ge=1),
     limit: int = 100,
     current_user: UserModelDB = Depends(current_active_user),
     csrf_protect: CsrfProtect = Depends(),
@@ -47,10 +72,14 @@ async def get_users(
 
     Args:
         request (Request): The request object.
+        cursor (Optional[str]): The cursor of the page to load, None for the first.
+        before (Optional[str]): The cursor following the page to load, going back.
+        page_number (int): The number of the page, shown by the pagination controls.
+        limit (int): The number of users per page.
         current_user (UserModelDB): The current user object obtained from the current_active_user dependency.
 
     Returns:
-        TemplateResponse: The HTML response containing the "partials/add_user.html" template.
+        TemplateResponse: The HTML response containing the "pages/user.html" template.
 
     Raises:
         HTTPException: If the current user is not a superuser, with a 403 Forbidden status code.
@@ -63,7 +92,32 @@ async def get_users(
         # Access the cookies using the Request object
 
         token = request.cookies.get("fastapiusersauth")
-        users = await user_crud.read_all(db, skip, limit, join_relationships=True)
+        version = await read_version(db, UserModelDB, RoleModelDB, UserProfileModelDB)
+
+        # The page is answered with 304 while the users, the session and the CSRF
+        # cookie the browser holds are unchanged, without querying the rows or rendering
+        page_context = {
+            "token": token,
+            "cursor": cursor,
+            "before": before,
+            "page": page_number,
+            "limit": limit,
+        }
+        csrf_cookie = request.cookies.get(csrf_protect._cookie_key)
+        etag = page_etag("pages/user.html", version, page_context, csrf_cookie)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        # The page after `cursor`, or before `before`, with the total number of users
+        page = await user_crud.read_page(
+            db,
+            cursor=before or cursor,
+            limit=limit,
+            backwards=before is not None,
+            join_relationships=True,
+            columns=USER_TABLE_COLUMNS,
+            with_total=True,
+        )
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
@@ -71,11 +125,17 @@ async def get_users(
             "pages/user.html",
             {
                 "request": request,
-                "users": users,
+                "users": page.items,
+                "page": page,
+                "page_number": page_number,
+                "limit": limit,
                 "token": token,
                 "csrf_token": csrf_token,
                 "user_type": current_user.is_superuser,
             },
+            headers=validation_headers(
+                page_etag("pages/user.html", version, page_context, signed_token)
+            ),
         )
 
         csrf_protect.set_csrf_cookie(signed_token, response)
@@ -96,6 +156,168 @@ async def get_users(
         )
 
 
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Returns the smallest string, in code point order, greater than every string
+    starting with `prefix`, or None when there is none (a prefix of U+10FFFF only).
+    """
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+    following = ord(stripped[-1]) + 1
+    # Surrogates cannot be encoded, the first character after them is U+E000
+    if 0xD800 <= following <= 0xDFFF:
+        following = 0xE000
+    return stripped[:-1] + chr(following)
+
+
+def _prefix_match(column, prefix: str, dialect_name: str) -> ColumnElement[bool]:
+    """
+    Matches the rows where lower(column) starts with the lower case `prefix`.
+
+    SQLite only uses an index for LIKE under settings the app does not change, so the
+    prefix is also written as a range, which lets it seek the lower(column) expression
+    index. SQLite compares text by code point, like the range does. Other databases
+    compare with the collation of the column, where a range bound by code point would
+    skip rows, so they get the escaped LIKE alone.
+    """
+    lowered = func.lower(column)
+    match = lowered.startswith(prefix, autoescape=True)
+    if dialect_name != "sqlite":
+        return match
+    criteria = [lowered >= prefix, match]
+    upper_bound = _prefix_upper_bound(prefix)
+    if upper_bound is not None:
+        criteria.append(lowered < upper_bound)
+    return and_(*criteria)
+
+
+def _user_search_filters(query: str, dialect_name: str) -> list[ColumnElement[bool]]:
+    """
+    Builds the criteria of a user search: every word of `query` must start the email,
+    the first or last name, the company, the city or the role name of the user, on a
+    database of the given dialect.
+
+    The longest word, usually the most selective, is looked up on every column
+    separately and the matching user ids are combined with UNION, so that each lookup
+    seeks its own index. The other words are only checked on the users found.
+    """
+    words = sorted(set(query.lower().split()[:5]), key=len, reverse=True)
+    if not words:
+        return []
+    profile_columns = [
+        UserProfileModelDB.first_name,
+        UserProfileModelDB.last_name,
+        UserProfileModelDB.company,
+        UserProfileModelDB.city,
+    ]
+
+    def profile_match(word: str) -> ColumnElement[bool]:
+        return or_(
+            *(_prefix_match(column, word, dialect_name) for column in profile_columns)
+        )
+
+    matching_ids = union(
+        select(UserModelDB.id).where(
+            _prefix_match(UserModelDB.email, words[0], dialect_name)
+        ),
+        select(UserModelDB.id).join(UserModelDB.profile).where(profile_match(words[0])),
+        select(UserModelDB.id)
+        .join(UserModelDB.role)
+        .where(_prefix_match(RoleModelDB.role_name, words[0], dialect_name)),
+    )
+    filters = [UserModelDB.id.in_(matching_ids)]
+    for word in words[1:]:
+        filters.append(
+            or_(
+                _prefix_match(UserModelDB.email, word, dialect_name),
+                UserModelDB.profile.has(profile_match(word)),
+                UserModelDB.role.has(
+                    _prefix_match(RoleModelDB.role_name, word, dialect_name)
+                ),
+            )
+        )
+    return filters
+
+
+@user_view_route.get("/search_users", response_class=HTMLResponse)
+async def search_users(
+    request: Request,
+    db: CurrentReadSession,
+    q: str = "",
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    page_number: int = Query(1, alias="page", ge=1),
+    limit: int = 100,
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    """
+    Route handler function searching the users from the search box of the user page.
+
+    Args:
+        request (Request): The request object.
+        q (str): The words searched, an empty search lists all the users.
+        cursor (Optional[str]): The cursor of the page to load, None for the first.
+        before (Optional[str]): The cursor following the page to load, going back.
+        page_number (int): The number of the page, shown by the pagination controls.
+        limit (int): The number of users per page.
+        current_user (UserModelDB): The current user object obtained from the current_active_user dependency.
+
+    Returns:
+        TemplateResponse: The "partials/user/user_table.html" table of the matching
+        users, with the pagination controls of the search.
+
+    Raises:
+        HTTPException: If the current user is not a superuser, with a 403 Forbidden status code.
+    """
+    try:
+        if not current_user.is_superuser:
+            raise HTTPException(
+                status_code=403, detail="Not authorized to view this page"
+            )
+        token = request.cookies.get("fastapiusersauth")
+        q = q.strip()[:100]
+
+        async def load_users():
+            page = await user_crud.read_page(
+                db,
+                cursor=before or cursor,
+                limit=limit,
+                backwards=before is not None,
+                join_relationships=True,
+                columns=USER_TABLE_COLUMNS,
+                filters=_user_search_filters(q, db.get_bind().dialect.name),
+                with_total=True,
+            )
+            return {"users": page.items, "page": page}
+
+        return await render_fragment(
+            request,
+            "partials/user/user_table.html",
+            await read_version(db, UserModelDB, RoleModelDB, UserProfileModelDB),
+            {
+                "q": q,
+                "cursor": cursor,
+                "before": before,
+                "page_number": page_number,
+                "limit": limit,
+                "token": token,
+                "csrf_token": request.headers.get("X-CSRF-Token"),
+            },
+            load_users,
+        )
+    except Exception as e:
+        return handle_error(
+            "partials/user/user_table.html",
+            {
+                "request": request,
+                "csrf_token": request.headers.get("X-CSRF-Token"),
+                "token": request.cookies.get("fastapiusersauth"),
+            },
+            e,
+        )
+
+
 @user_view_route.get("/get_create_users", response_class=HTMLResponse)
 async def get_create_users(
     request: Request,
@@ -133,12 +355,13 @@ async def get_user_by_id(
     request: Request,
     user_id: uuid.UUID,
     db: CurrentAsyncSession,
+    all_roles: ReferenceRoles,
     current_user: UserModelDB = Depends(current_active_user),
     skip: int = 0,
     limit: int = 100,
 ):
+    roles = all_roles[skip : skip + limit]
     try:
-        roles = await role_crud.read_all(db, skip, limit)
         # checking the current user as super user
         if not current_user.is_superuser:
             raise HTTPException(
@@ -216,76 +439,55 @@ async def post_update_user(
                 status_code=400, detail="Role is required to create a user Profile"
             )
 
-        # Fetch the user being updated
-        user_to_update = await user_crud.read_by_primary_key(db, user_id)
-
-        if user_to_update.profile_id is None:
-            # Create UserProfile
-            new_profile = await user_profile_crud.create(dict(profile_data), db)
-
-            # Update user profile id
-            await user_crud.update(db, user_id, {"profile_id": new_profile.id})
-
-            # Update user role
-            if role_id:
+        # The profile and the user are written in a single transaction
+        async with unit_of_work(db):
+            # Fetch the user being updated
+            user_to_update = await user_crud.read_by_primary_key(db, user_id)
+
+            if user_to_update.profile_id is None:
+                # Create UserProfile
+                new_profile = await user_profile_crud.create(dict(profile_data), db)
+
+                # Update user profile id and role
+                await user_crud.update(
+                    db, user_id, {"profile_id": new_profile.id, "role_id": role_id}
+                )
+            else:
+                # Update existing user profile
+                await user_profile_crud.update(
+                    db, user_to_update.profile_id, dict(profile_data)
+                )
+
+                # Update user role
                 await user_crud.update(db, user_id, {"role_id": role_id})
+        await invalidate_cached_user(user_id)
+        activity_logger.log(current_user.id, "user-update", str(user_id))
 
-            csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
-            headers = {
-                "HX-Location": "/user",
-                "HX-Trigger": json.dumps(
-                    {
-                        "showAlert": {
-                            "type": "updated",
-                            "message": f"Profile for {profile_data.first_name , profile_data.last_name} updated successfully.",
-                            "source": "user-page",
-                        },
-                    }
-                ),
-                "csrf_token": csrf_token,
-            }
-            response = HTMLResponse(content="", headers=headers)
-
-            csrf_protect.unset_csrf_cookie(response)
-
-            csrf_protect.set_csrf_cookie(signed_token, response)
-
-            return response
-        else:
-            # Update existing user profile
-            await user_profile_crud.update(
-                db, user_to_update.profile_id, dict(profile_data)
-            )
-
-            # Update user role
-            if role_id:
-                await user_crud.update(db, user_id, {"role_id": role_id})
+        csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
 
-            csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
-
-            headers = {
-                "HX-Location": "/user",
-                "HX-Trigger": json.dumps(
-                    {
-                        "showAlert": {
-                            "type": "updated",
-                            "message": f"Profile for {profile_data.first_name , profile_data.last_name} updated successfully.",
-                            "source": "user-page",
-                        },
-                    }
-                ),
-                "csrf_token": csrf_token,
-            }
-            response = HTMLResponse(content="", headers=headers)
+        headers = {
+            "HX-Location": "/user",
+            "HX-Trigger": json.dumps(
+                {
+                    "showAlert": {
+                        "type": "updated",
+                        "message": f"Profile for {profile_data.first_name , profile_data.last_name} updated successfully.",
+                        "source": "user-page",
+                    },
+                }
+            ),
+            "csrf_token": csrf_token,
+        }
+        response = HTMLResponse(content="", headers=headers)
 
-            csrf_protect.unset_csrf_cookie(response)
+        csrf_protect.unset_csrf_cookie(response)
 
-            csrf_protect.set_csrf_cookie(signed_token, response)
+        csrf_protect.set_csrf_cookie(signed_token, response)
 
-            return response
+        return response
     except Exception as e:
         user = await user_crud.read_by_primary_key(db, user_id, join_relationships=True)
-        roles = await role_crud.read_all(db)
+        roles = await reference_rows(db, RoleModelDB)
         csrf_token = request.headers.get("X-CSRF-Token")
         return handle_error(
             "partials/user/edit_user.html",
@@ -1,15 +1,197 @@
+import base64
+import hashlib
+import json
 import uuid
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from fastapi import HTTPException
-from sqlalchemy import func, inspect, select
-from sqlalchemy.orm import joinedload
-
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.orm import (
+    MANYTOONE,
+    joinedload,
+    load_only,
+    selectinload,
+    subqueryload,
+)
+
+from app.core.cache import cache
+from app.core.cache_settings import settings as cache_settings
+from app.core.fragment_cache import (
+    bump_data_version,
+    cascaded_tables,
+    table_generation,
+)
+from app.core.stats import add_to_counters
 from app.database.base import Base
-from app.database.db import CurrentAsyncSession
+from app.database.db import CurrentAsyncSession, may_lag
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# Loader options that can be selected per relationship through `load_strategies`
+LOADING_STRATEGIES = {
+    "joined": joinedload,
+    "selectin": selectinload,
+    "subquery": subqueryload,
+}
+
+
+@dataclass
+class KeysetPage(Generic[ModelType]):
+    """
+    A single page of records returned by `SQLAlchemyCRUD.read_page`.
+
+    Args:
+        items (List[ModelType]): The records on this page, ordered by (created, id).
+        next_cursor (Optional[str]): Cursor of the following page, None on the last.
+        prev_cursor (Optional[str]): Cursor of the preceding page, None on the first.
+        total (Optional[int]): The number of records of all the pages, when requested.
+        total_estimated (bool): Whether `total` is an estimate of the database planner.
+    """
+
+    items: List[ModelType] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_estimated: bool = False
+
+
+def encode_cursor(created: datetime, id: uuid.UUID) -> str:
+    """
+    Encodes the (created, id) position of a record into an opaque, URL safe cursor.
+    """
+    payload = json.dumps([created.isoformat(sep=" "), str(id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Decodes a cursor produced by `encode_cursor` back into its (created, id) position.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created), uuid.UUID(id)
+    except (ValueError, TypeError) as err:
+        raise HTTPException(
+            status_code=400, detail="Invalid pagination cursor"
+        ) from err
+
+
+# INSERT constructs supporting ON CONFLICT DO NOTHING, per dialect name
+ON_CONFLICT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+# Row count of a PostgreSQL table estimated by the planner, as of its last ANALYZE
+ESTIMATED_COUNT = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"
+)
+
+# Session.info key holding the tables written by the unit of work in progress
+UNIT_OF_WORK = "unit_of_work"
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Groups the SQLAlchemyCRUD writes made inside the block into a single transaction.
+
+    Inside the block the CRUD methods flush their changes instead of committing them and
+    only refresh the records when asked to, then the block commits once on exit, or
+    rolls everything back if it raises. Nested blocks join the outer one.
+
+    Example:
+        async with unit_of_work(db):
+            profile = await user_profile_crud.create(profile_data, db)
+            await user_crud.update(db, user_id, {"profile_id": profile.id})
+    """
+    if UNIT_OF_WORK in db.info:
+        yield db
+        return
+    db.info[UNIT_OF_WORK] = set()
+    try:
+        yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        tables = db.info.pop(UNIT_OF_WORK)
+    await bump_data_version(*tables)
+
+
+def returning_update_values(
+    db: AsyncSession, model: Type[Base], data: dict[str, Any]
+) -> Optional[dict[str, Any]]:
+    """
+    Returns the items of `data` to write with a single UPDATE ... RETURNING, or None
+    when the record has to be updated through the ORM: the database cannot return the
+    updated rows, or `data` assigns a relationship.
+
+    Keys that are not mapped at all (e.g. `role_id` of the role schemas) are dropped, as
+    setting them on a record never reaches the database either.
+    """
+    mapper = inspect(model)
+    if not db.get_bind().dialect.update_returning or any(
+        key in mapper.relationships for key in data
+    ):
+        return None
+    return {key: value for key, value in data.items() if key in mapper.column_attrs}
+
+
+def deletes_in_bulk(db: AsyncSession, model: Type[Base]) -> bool:
+    """
+    Whether a record can be removed with a plain DELETE ... RETURNING, which skips the
+    ORM cascades. That is only the case when every relationship of the model points to
+    a parent (many-to-one), so deleting it never has to update or remove other rows.
+    """
+    if not db.get_bind().dialect.delete_returning:
+        return False
+    return all(
+        relationship.direction is MANYTOONE and relationship.secondary is None
+        for relationship in inspect(model).relationships
+    )
+
 
 class SQLAlchemyCRUD(Generic[ModelType]):
     """
@@ -27,39 +209,232 @@ class SQLAlchemyCRUD(Generic[ModelType]):
                 related_models = {
                     Profile: "profile"  # Here, "profile" is the relationship attribute name in the `User` model
                 }
+        load_strategies (Optional[Dict[str, str]]): Overrides the eager loading strategy
+        ("joined", "selectin" or "subquery") per relationship attribute name. By default
+        collections use "selectin", so that they do not multiply the parent rows, and
+        scalar (many-to-one / one-to-one) relationships use "joined".
     """
 
     def __init__(
         self,
         db_model: Type[ModelType],
         related_models: Optional[Dict[Type[Base], str]] = None,
+        load_strategies: Optional[Dict[str, str]] = None,
     ):
         self.db_model = db_model
         self.related_models = related_models if related_models is not None else {}
+        self.load_strategies = load_strategies if load_strategies is not None else {}
+        # Whether each column looked up by `read_by_column` has a lower() index
+        self._lower_indexes: Dict[str, bool] = {}
+        for join_column, strategy in self.load_strategies.items():
+            if strategy not in LOADING_STRATEGIES:
+                raise ValueError(
+                    f"Unknown loading strategy {strategy!r} for {join_column}"
+                )
+
+    def _with_relationships(
+        self,
+        stmt: Select,
+        join_relationships: bool,
+        columns: Optional[List[str]] = None,
+    ) -> Select:
+        """
+        Adds eager loading options for the configured related models to a SELECT.
+
+        Args:
+            stmt (Select): The statement selecting `db_model`.
+            join_relationships (bool): Whether to eager load the related models.
+            columns (Optional[List[str]]): The columns to load with `load_only`, e.g.
+                ["email", "role.role_name"] for related models. Primary keys are always
+                loaded. Defaults to None (all columns).
+        """
+        own_columns: List[str] = []
+        related_columns: Dict[str, List[str]] = {}
+        for column in columns or []:
+            join_column, _, related_column = column.rpartition(".")
+            if join_column:
+                related_columns.setdefault(join_column, []).append(related_column)
+            else:
+                own_columns.append(related_column)
+        if own_columns:
+            stmt = stmt.options(
+                load_only(*[getattr(self.db_model, name) for name in own_columns])
+            )
+        if not join_relationships:
+            return stmt
+        for related_model, join_column in self.related_models.items():
+            relationship = getattr(self.db_model, join_column, None)
+
+            if relationship is not None:
+                strategy = self.load_strategies.get(join_column)
+                if strategy is None:
+                    strategy = "selectin" if relationship.property.uselist else "joined"
+                loader = LOADING_STRATEGIES[strategy](relationship)
+                if join_column in related_columns:
+                    loader = loader.load_only(
+                        *[
+                            getattr(related_model, name)
+                            for name in related_columns[join_column]
+                        ]
+                    )
+                stmt = stmt.options(loader)
+
+            else:
+                # Handle error or invalid relationship specification
+                raise ValueError(f"No relationship found for {join_column}")
+        return stmt
+
+    async def _save(
+        self,
+        db: CurrentAsyncSession,
+        record: Optional[ModelType] = None,
+        refresh: Optional[bool] = None,
+        cascaded: Sequence[str] = (),
+    ) -> None:
+        """
+        Commits the pending changes, or only flushes them inside a `unit_of_work`, then
+        refreshes `record`. By default (refresh=None) records are refreshed after a
+        commit but not inside a unit of work. The data version of the model table, and
+        of the `cascaded` tables the write also changed, is bumped after the commit.
+        """
+        written = [self.db_model.__tablename__, *cascaded]
+        tables = db.info.get(UNIT_OF_WORK)
+        if tables is None:
+            await db.commit()
+            await bump_data_version(*written)
+        else:
+            await db.flush()
+            tables.update(written)
+        if record is not None and (tables is None if refresh is None else refresh):
+            await db.refresh(record)
 
-    async def create(self, data: dict[str, Any], db: CurrentAsyncSession) -> ModelType:
+    async def create(
+        self,
+        data: dict[str, Any],
+        db: CurrentAsyncSession,
+        refresh: Optional[bool] = None,
+    ) -> ModelType:
         """
         Creates a new record in the database.
 
         Args:
             data (dict[str, Any]): The data to be inserted into the database record.
             db (CurrentAsyncSession): The database session to be used for the operation.
+            refresh (Optional[bool]): Whether to reload the record, e.g. to read server
+                defaults. Defaults to None (only outside of a `unit_of_work`).
 
         Returns:
             ModelType: The newly created database record.
         """
         new_record = self.db_model(**data)
         db.add(new_record)
-        await db.commit()
-        await db.refresh(new_record)
+        await add_to_counters(db, self.db_model.__tablename__, [new_record])
+        await self._save(db, new_record, refresh)
         return new_record
 
+    async def create_if_absent(
+        self,
+        data: dict[str, Any],
+        db: CurrentAsyncSession,
+    ) -> Optional[ModelType]:
+        """
+        Creates a new record unless it conflicts with a unique constraint or index, e.g.
+        a name already taken, in a single statement.
+
+        On SQLite and PostgreSQL this is an INSERT ... ON CONFLICT DO NOTHING RETURNING,
+        which cannot race with a concurrent insert of the same name the way a lookup
+        followed by an insert can. Other backends insert within a savepoint and treat an
+        IntegrityError as a conflict.
+
+        Args:
+            data (dict[str, Any]): The data to be inserted into the database record.
+            db (CurrentAsyncSession): The database session to be used for the operation.
+
+        Returns:
+            Optional[ModelType]: The newly created database record, or None if a
+            conflicting record already exists.
+        """
+        dialect = db.get_bind().dialect
+        if dialect.name in ON_CONFLICT_INSERTS and dialect.insert_returning:
+            stmt = (
+                ON_CONFLICT_INSERTS[dialect.name](self.db_model)
+                .values(**data)
+                .on_conflict_do_nothing()
+                .returning(self.db_model)
+            )
+            new_record = (await db.scalars(stmt)).one_or_none()
+        else:
+            new_record = self.db_model(**data)
+            try:
+                async with db.begin_nested():
+                    db.add(new_record)
+            except IntegrityError:
+                new_record = None
+        if new_record is not None:
+            await add_to_counters(db, self.db_model.__tablename__, [new_record])
+            await self._save(db)
+        return new_record
+
+    async def create_many(
+        self,
+        data: List[dict[str, Any]],
+        db: CurrentAsyncSession,
+        chunk_size: int = 500,
+    ) -> int:
+        """
+        Creates records in bulk with one multi-row INSERT per `chunk_size` records, all
+        committed together (or left to the enclosing `unit_of_work`).
+
+        Unlike `create`, the records are not added to the session nor loaded back.
+
+        Args:
+            data (List[dict[str, Any]]): The records to insert, all with the same keys.
+            db (CurrentAsyncSession): The database session to be used for the operation.
+            chunk_size (int, optional): Records per INSERT. Defaults to 500.
+
+        Returns:
+            int: The number of records created.
+        """
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start : start + chunk_size]
+            await db.execute(insert(self.db_model).values(chunk))
+        if data:
+            await add_to_counters(db, self.db_model.__tablename__, data)
+            await self._save(db)
+        return len(data)
+
+    async def read_existing_values(
+        self,
+        db: CurrentAsyncSession,
+        column_name: str,
+        values: Iterable[Any],
+    ) -> set[Any]:
+        """
+        Returns which of `values` are already stored in a column, with a single query.
+        Strings are compared like in `read_by_column`, and returned in lower case when
+        compared case insensitively.
+        """
+        column = getattr(self.db_model, column_name)
+        values = set(values)
+        if not values:
+            return set()
+        if all(isinstance(value, str) for value in values) and self._has_lower_index(
+            column_name
+        ):
+            lowered = {value.lower() for value in values}
+            stmt = select(func.lower(column)).where(func.lower(column).in_(lowered))
+        else:
+            stmt = select(column).where(column.in_(values))
+        query = await db.execute(stmt)
+        return set(query.scalars().all())
+
     async def read_all(
         self,
         db: CurrentAsyncSession,
         skip: int = 0,
         limit: int = 0,
         join_relationships: bool = False,
+        columns: Optional[List[str]] = None,
     ) -> List[ModelType]:
         """
         Retrieves all records from the database, optionally with pagination.
@@ -69,27 +444,201 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             skip (int, optional): The number of records to skip. Defaults to 0.
             limit (int, optional): The maximum number of records to return. Defaults to 0 (no limit).
             join_relationships (bool, optional): Whether to JOIN related tables. Defaults to False.
+            columns (Optional[List[str]], optional): The columns to load, see
+                `_with_relationships`. Defaults to None (all columns).
 
         Returns:
             List[ModelType]: A list of database records.
         """
-        stmt = select(self.db_model)
-        if join_relationships:
-            for related_model, join_column in self.related_models.items():
-                relationship = getattr(self.db_model, join_column, None)
-
-                if relationship is not None:
-                    stmt = stmt.options(joinedload(relationship))
-
-                else:
-                    # Handle error or invalid relationship specification
-                    raise ValueError(f"No relationship found for {join_column}")
+        stmt = self._with_relationships(
+            select(self.db_model), join_relationships, columns
+        )
         stmt = stmt.offset(skip)
         if limit:
             stmt = stmt.limit(limit)
         query = await db.execute(stmt)
         return list(query.unique().scalars().all())
 
+    async def stream_all(
+        self,
+        db: CurrentAsyncSession,
+        join_relationships: bool = False,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[ModelType]:
+        """
+        Iterates over all records ordered by (created, id) through a server-side cursor.
+
+        Unlike `read_all`, the rows are fetched `batch_size` at a time while iterating,
+        so the memory used stays the same whatever the size of the table.
+
+        Args:
+            db (CurrentAsyncSession): The database session to be used for the operation.
+                It must stay open until the iteration is over.
+            join_relationships (bool, optional): Whether to JOIN related tables. Defaults to False.
+            columns (Optional[List[str]], optional): The columns to load, see
+                `_with_relationships`. Defaults to None (all columns).
+            batch_size (int, optional): Rows fetched at once. Defaults to 1000.
+
+        Yields:
+            ModelType: The database records.
+        """
+        stmt = self._with_relationships(
+            select(self.db_model), join_relationships, columns
+        )
+        stmt = stmt.order_by(self.db_model.created, self.db_model.id)
+        result = await db.stream_scalars(stmt.execution_options(yield_per=batch_size))
+        async for record in result:
+            yield record
+
+    async def read_page(
+        self,
+        db: CurrentAsyncSession,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        backwards: bool = False,
+        join_relationships: bool = False,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[ColumnElement[bool]]] = None,
+        with_total: bool = False,
+    ) -> KeysetPage[ModelType]:
+        """
+        Retrieves a page of records using keyset (cursor) pagination on (created, id).
+
+        Unlike `read_all` with `skip`, the database seeks to the cursor instead of
+        scanning the skipped rows, so every page costs the same.
+
+        Args:
+            db (CurrentAsyncSession): The database session to be used for the operation.
+            cursor (Optional[str]): A cursor of a previous page. Defaults to None.
+            limit (int, optional): The maximum number of records. Defaults to 100.
+            backwards (bool, optional): Whether to read the page before the cursor.
+            join_relationships (bool, optional): Whether to JOIN related tables.
+            columns (Optional[List[str]], optional): The columns to load, see
+                `_with_relationships`, always with `created`. Defaults to None (all).
+            filters (Optional[List[ColumnElement[bool]]], optional): Criteria the
+                records must match, e.g. a search. Defaults to None.
+            with_total (bool, optional): Whether to add the total, see `count`.
+
+        Returns:
+            KeysetPage[ModelType]: The records with the next and previous cursors.
+
+        Raises:
+            HTTPException: If the cursor is malformed.
+        """
+        key = tuple_(self.db_model.created, self.db_model.id)
+        if columns is not None and "created" not in columns:
+            columns = [*columns, "created"]
+        stmt = self._with_relationships(
+            select(self.db_model), join_relationships, columns
+        )
+        if filters:
+            stmt = stmt.where(*filters)
+        if cursor:
+            created, id = decode_cursor(cursor)
+            position = tuple_(
+                self._keyset_value(db, created), literal(id, self.db_model.id.type)
+            )
+            stmt = stmt.where(key < position if backwards else key > position)
+        if backwards:
+            stmt = stmt.order_by(self.db_model.created.desc(), self.db_model.id.desc())
+        else:
+            stmt = stmt.order_by(self.db_model.created, self.db_model.id)
+        # Fetching one extra row tells whether another page exists without a COUNT(*)
+        query = await db.execute(stmt.limit(limit + 1))
+        records = list(query.unique().scalars().all())
+        has_more = len(records) > limit
+        records = records[:limit]
+        if backwards:
+            records.reverse()
+        page = KeysetPage(items=records)
+        if with_total:
+            page.total, page.total_estimated = await self.count(db, filters)
+        if not records:
+            return page
+        first = encode_cursor(records[0].created, records[0].id)
+        last = encode_cursor(records[-1].created, records[-1].id)
+        if backwards:
+            page.next_cursor = last if cursor else None
+            page.prev_cursor = first if has_more else None
+        else:
+            page.next_cursor = last if has_more else None
+            page.prev_cursor = first if cursor else None
+        return page
+
+    async def count(
+        self,
+        db: CurrentAsyncSession,
+        filters: Optional[List[ColumnElement[bool]]] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Counts the records matching `filters`, e.g. for the total of a paginated list.
+
+        The counts are cached for COUNT_CACHE_TTL seconds under the write generation of
+        the table, so that paging through a list counts it once rather than on every
+        page. Unfiltered PostgreSQL tables above COUNT_ESTIMATE_THRESHOLD rows are not
+        counted: the row count estimated by the planner is returned.
+
+        Args:
+            db (CurrentAsyncSession): The database session to be used for the operation.
+            filters (Optional[List[ColumnElement[bool]]], optional): Criteria the
+                records must match. Defaults to None (all records).
+
+        Returns:
+            Tuple[int, bool]: The number of records, and whether it is an estimate.
+        """
+        stmt = select(func.count()).select_from(self.db_model)
+        if filters:
+            stmt = stmt.where(*filters)
+        dialect = db.get_bind().dialect
+        compiled = stmt.compile(dialect=dialect)
+        statement_key = hashlib.sha1(
+            json.dumps([str(compiled), compiled.params], default=str).encode()
+        ).hexdigest()
+        table_name = self.db_model.__tablename__
+        # The filters may look up other tables (e.g. the profiles of a user search),
+        # whose writes change the count as well
+        tables = sorted(
+            {
+                element.name
+                for element in visitors.iterate(stmt)
+                if isinstance(element, Table)
+            }
+        )
+        generations = [await table_generation(table) for table in tables]
+        version = hashlib.sha1(json.dumps(generations).encode()).hexdigest()
+        key = f"count:{table_name}:{version}:{statement_key}"
+        cached = await cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+
+        result = None
+        if not filters and dialect.name == "postgresql":
+            query = await db.execute(ESTIMATED_COUNT, {"table_name": table_name})
+            estimate = query.scalar_one_or_none()
+            threshold = cache_settings.count_estimate_threshold
+            if estimate is not None and estimate >= threshold:
+                result = (estimate, True)
+        if result is None:
+            result = ((await db.execute(stmt)).scalar_one(), False)
+        # A lagging replica would keep an old count under the new generation
+        if cache_settings.count_cache_ttl and not await may_lag(db, *tables):
+            await cache.set(key, result, cache_settings.count_cache_ttl)
+        return result
+
+    @staticmethod
+    def _keyset_value(db: CurrentAsyncSession, created: datetime) -> Any:
+        """
+        Binds the `created` part of a cursor so that it compares like the stored column.
+
+        SQLite keeps DATETIME as text and `server_default=func.now()` writes it without
+        microseconds, so binding a datetime (always rendered with microseconds) would
+        skip rows created within the same second as the cursor.
+        """
+        if db.bind is not None and db.bind.dialect.name == "sqlite":
+            return literal(created.replace(tzinfo=None).isoformat(sep=" "), String)
+        return created
+
     async def read_by_primary_key(
         self,
         db: CurrentAsyncSession,
@@ -110,16 +659,7 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         Raises:
             HTTPException: If the record cannot be found.
         """
-        stmt = select(self.db_model)
-        if join_relationships:
-            for related_model, join_column in self.related_models.items():
-                relationship = getattr(self.db_model, join_column, None)
-                # print(relationship)
-                if relationship is not None:
-                    stmt = stmt.options(joinedload(relationship))
-                else:
-                    # Handle error or invalid relationship specification
-                    raise ValueError(f"No relationship found for {join_column}")
+        stmt = self._with_relationships(select(self.db_model), join_relationships)
         stmt = stmt.where(self.db_model.id == id)
         query = await db.execute(stmt)
         record = query.scalar()
@@ -127,6 +667,22 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
         return record
 
+    def _has_lower_index(self, column_name: str) -> bool:
+        """
+        Whether the table has an index on lower(column), e.g. one declared with
+        `Index("ix_roles_role_name_lower", func.lower(Role.role_name))`.
+        """
+        if column_name not in self._lower_indexes:
+            column = self.db_model.__table__.c[column_name]
+            self._lower_indexes[column_name] = any(
+                isinstance(expression, FunctionElement)
+                and expression.name == "lower"
+                and any(clause.compare(column) for clause in expression.clauses)
+                for index in self.db_model.__table__.indexes
+                for expression in index.expressions
+            )
+        return self._lower_indexes[column_name]
+
     async def read_by_column(
         self,
         db: CurrentAsyncSession,
@@ -138,6 +694,9 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         """
         Retrieves records from the database that match a specific column value.
 
+        Strings are compared case insensitively on the columns with a lower() expression
+        index, which the comparison can use, and exactly on the others.
+
         Args:
             db (AsyncSession): The database session to be used for the operation.
             column_name (str): The name of the column to be used for the search.
@@ -154,7 +713,7 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         """
         column = getattr(self.db_model, column_name)
 
-        if isinstance(column_value, str):
+        if isinstance(column_value, str) and self._has_lower_index(column_name):
             stmt = select(self.db_model).where(
                 func.lower(column) == column_value.lower()
             )
@@ -175,7 +734,11 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             return records
 
     async def update(
-        self, db: CurrentAsyncSession, id: uuid.UUID, data: dict[str, Any]
+        self,
+        db: CurrentAsyncSession,
+        id: uuid.UUID,
+        data: dict[str, Any],
+        refresh: Optional[bool] = None,
     ) -> ModelType | None:
         """
         Updates a single record in the database by its primary key.
@@ -184,23 +747,45 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             db (CurrentAsyncSession): The database session to be used for the operation.
             id (uuid.UUID): The primary key of the record to be updated.
             data (dict[str, Any]): The data to be updated in the record.
+            refresh (Optional[bool]): Whether to reload the record, e.g. to read server
+                defaults. Defaults to None (only outside of a `unit_of_work`). Backends
+                supporting UPDATE ... RETURNING return the stored record in the same
+                statement, so it is only reloaded there when refresh=True.
 
         Returns:
-            ModelType | None: The updated database record,
-            or None if the record could not be found.
+            ModelType | None: The updated database record.
+
+        Raises:
+            HTTPException: If the record cannot be found.
         """
-        stmt = select(self.db_model).where(self.db_model.id == id)
-        query = await db.execute(stmt)
-        if not query:
-            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            for key, value in data.items():
-                setattr(db_item, key, value)
-            await db.commit()
-            await db.refresh(db_item)
+        values = returning_update_values(db, self.db_model, data)
+        if values is not None:
+            # A single UPDATE ... RETURNING writes the record and reads it back, server
+            # side `onupdate` values included, and refreshes it if the session holds it
+            stmt = (
+                update(self.db_model)
+                .where(self.db_model.id == id)
+                .values(**values)
+                .returning(self.db_model)
+                .execution_options(populate_existing=True)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await self._save(db, db_item, bool(refresh))
             return db_item
 
+        # A record already loaded by the session is updated without selecting it again
+        db_item = await db.get(self.db_model, id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
+        for key, value in data.items():
+            setattr(db_item, key, value)
+        await self._save(db, db_item, refresh)
+        return db_item
+
     async def delete(
         self,
         db: CurrentAsyncSession,
@@ -214,18 +799,35 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             id (uuid.UUID): The primary key of the record to be deleted.
 
         Returns:
-            bool: True if the record was deleted, False if the record could not be found.
+            bool: True if the record was deleted.
+
+        Raises:
+            HTTPException: If the record cannot be found.
         """
-        stmt = select(self.db_model).where(self.db_model.id == id)
-        query = await db.execute(stmt)
-        if not query:
-            raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
+        cascaded: List[str] = []
+        if deletes_in_bulk(db, self.db_model):
+            stmt = (
+                delete(self.db_model)
+                .where(self.db_model.id == id)
+                .returning(self.db_model)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+        else:
+            # Records with children or association rows go through the ORM cascades
+            db_item = await db.get(self.db_model, id)
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
             await db.delete(db_item)
-            await db.commit()
-            return True
-        return False
+            cascaded = cascaded_tables(self.db_model)
+        await add_to_counters(db, self.db_model.__tablename__, [db_item], -1)
+        await self._save(db, cascaded=cascaded)
+        return True
 
     async def check_associated_records(
         self,
@@ -248,3 +850,57 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         )
         existing_record = result.scalar_one_or_none()
         return existing_record
+
+    async def sync_links(
+        self,
+        db: CurrentAsyncSession,
+        parent_column: str,
+        parent_id: uuid.UUID,
+        child_column: str,
+        child_ids: Iterable[uuid.UUID],
+        scope_ids: Optional[Iterable[uuid.UUID]] = None,
+    ) -> tuple[int, int]:
+        """
+        Synchronises the rows of an association model so that `parent_id` is linked to
+        exactly `child_ids`, with the same number of statements whatever the set size.
+
+        The current links are read with one SELECT, the missing ones added with one bulk
+        INSERT and the stale ones removed with one DELETE, committed together (or left
+        to the enclosing `unit_of_work`).
+
+        Args:
+            db (CurrentAsyncSession): The database session to be used for the operation.
+            parent_column (str): The column holding the parent key, e.g. "group_id".
+            parent_id (uuid.UUID): The parent whose links are synchronised.
+            child_column (str): The column holding the linked key, e.g. "user_id".
+            child_ids (Iterable[uuid.UUID]): The keys to link to the parent.
+            scope_ids (Optional[Iterable[uuid.UUID]]): Restricts removals to these keys,
+                e.g. the users offered on the form. Defaults to None (any stale link).
+
+        Returns:
+            tuple[int, int]: The number of links added and removed.
+        """
+        parent = getattr(self.db_model, parent_column)
+        child = getattr(self.db_model, child_column)
+        desired = set(child_ids)
+
+        query = await db.execute(select(child).where(parent == parent_id))
+        existing = set(query.scalars().all())
+
+        to_add = desired - existing
+        to_remove = existing - desired
+        if scope_ids is not None:
+            to_remove &= set(scope_ids)
+
+        if to_add:
+            await db.execute(
+                insert(self.db_model),
+                [{parent_column: parent_id, child_column: id} for id in to_add],
+            )
+        if to_remove:
+            await db.execute(
+                delete(self.db_model).where(parent == parent_id, child.in_(to_remove))
+            )
+        if to_add or to_remove:
+            await self._save(db)
+        return len(to_add), len(to_remove)
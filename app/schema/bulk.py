@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class RowError(BaseModel):
+    row: int = Field(..., title="Row", description="1-based position of the row")
+    errors: List[str] = Field(default_factory=list, title="Errors")
+
+
+class ImportResult(BaseModel):
+    created: int = Field(0, title="Created", description="Number of records created")
+    errors: List[RowError] = Field(default_factory=list, title="Rejected rows")
@@ -1,24 +1,48 @@
 /**
- * Sets up an event listener for the "htmx:afterRequest" event on the upload-files-table element.
- * When triggered, it checks if the event target is a file download button and initiates a file download.
+ * Uploads the selected file straight to MinIO through a presigned URL, then asks the
+ * back end to record it. The completion request goes through htmx so its HX-Trigger
+ * header shows the alert and refreshes the table like a regular upload.
  * function
- * listens htmx:afterRequest
- * returns {void}
+ * param {HTMLFormElement} form - The upload form, carrying the back end URLs as data attributes
+ * returns {Promise<void>}
  */
-document.addEventListener("DOMContentLoaded", function () {
-  document
-    .getElementById("upload-files-table")
-    .addEventListener("htmx:afterRequest", function (evt) {
-      if (evt.target && evt.target.id === "file-download-button") {
-        const downloadUrl = evt.target.getAttribute("hx-get");
-        const a = document.createElement("a");
-        a.href = downloadUrl;
-        a.download = ""; // Optional: specify a filename if needed
-        document.body.appendChild(a);
-        document.body.removeChild(a);
-      }
+async function uploadDirect(form) {
+  try {
+    const file = form.querySelector("input[type=file]").files[0];
+    const presignResponse = await fetch(form.dataset.presignUrl, {
+      method: "POST",
+      body: new URLSearchParams({ filename: file.name }),
+    });
+    const presign = await presignResponse.json();
+    if (!presignResponse.ok) {
+      throw new Error(presign.detail);
+    }
+
+    const uploadResponse = await fetch(presign.upload_url, {
+      method: "PUT",
+      body: file,
+      headers: { "Content-Type": file.type || "application/octet-stream" },
+    });
+    if (!uploadResponse.ok) {
+      throw new Error(`Upload failed with status ${uploadResponse.status}`);
+    }
+
+    await htmx.ajax("POST", form.dataset.completeUrl, {
+      target: "#upload-result",
+      swap: "innerHTML",
+      values: {
+        upload_token: presign.upload_token,
+        name: file.name,
+        source: form.elements.source.value,
+      },
     });
-});
+    form.reset();
+  } catch (error) {
+    console.error("Error in direct upload:", error);
+  } finally {
+    handleUploadRequest();
+  }
+}
 
 // Making a after request function to call and handle the loading state
 function handleUploadRequest() {
@@ -1,8 +1,35 @@
+import os
+
 from fastapi.templating import Jinja2Templates
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from app.core.template_settings import settings
 
-# Create a Jinja2 environment with auto-reload enabled
-jinja_env = Environment(loader=FileSystemLoader("app/templates"), auto_reload=True)
+if settings.template_mode == "production":
+    if settings.template_cache_dir:
+        os.makedirs(settings.template_cache_dir, exist_ok=True)
+    # Templates are compiled once (from the bytecode cache when available) and kept
+    # for the lifetime of the worker, without checking the files for changes
+    jinja_env = Environment(
+        loader=FileSystemLoader("app/templates"),
+        auto_reload=False,
+        cache_size=-1,
+        bytecode_cache=FileSystemBytecodeCache(settings.template_cache_dir),
+    )
+else:
+    # Create a Jinja2 environment with auto-reload enabled
+    jinja_env = Environment(loader=FileSystemLoader("app/templates"), auto_reload=True)
 
 # Use the custom environment in Jinja2Templates
 templates = Jinja2Templates(env=jinja_env)
+
+
+def precompile_templates() -> int:
+    """
+    Loads every template of app/templates into the environment cache, so that no request
+    pays for compiling one. Returns the number of templates loaded.
+    """
+    names = jinja_env.list_templates(extensions=["html"])
+    for name in names:
+        jinja_env.get_template(name)
+    return len(names)
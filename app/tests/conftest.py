@@ -0,0 +1,100 @@
+import asyncio
+import os
+import re
+import tempfile
+
+# The settings are read from the environment when the app modules are imported, so
+# the tests point the app at a database file of their own before importing any of them
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///{}".format(
+    os.path.join(tempfile.mkdtemp(prefix="fastapi-htmx-tests-"), "app.db")
+)
+for name, value in {
+    "MINIO_URL": "http://localhost:9000",
+    "MINIO_ACCESS_KEY": "access-key",
+    "MINIO_SECRET_KEY": "secret-key",
+    "MINIO_BUCKET": "bucket",
+    "CSRF_SECRET_KEY": "csrf-secret-key",
+    "COOKIE_SAMESITE": "lax",
+    "COOKIE_SECURE": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+from app.database.base import Base, create_engine  # noqa: E402
+from app.models.users import Role  # noqa: E402
+from app.routes.view.view_crud import SQLAlchemyCRUD  # noqa: E402
+
+SUPERUSER = {"username": "superuser@admin.com", "password": "password123"}
+AUTH_COOKIE = "fastapiusersauth"
+
+
+@pytest.fixture
+def role_crud():
+    return SQLAlchemyCRUD[Role](Role)
+
+
+@pytest.fixture
+def run_on_roles():
+    """
+    Runs `work(db)` with a session on a new in-memory database, ignoring a RuntimeError
+    it raises, and returns the names of the roles left in the database with the number
+    of commits.
+    """
+
+    async def run(work):
+        engine = create_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        commits = []
+
+        def count(conn):
+            commits.append(conn)
+
+        event.listen(engine.sync_engine, "commit", count)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as db:
+            try:
+                await work(db)
+            except RuntimeError:
+                pass
+        async with session_maker() as db:
+            names = (await db.execute(select(Role.role_name))).scalars().all()
+        await engine.dispose()
+        return sorted(names), len(commits)
+
+    return lambda work: asyncio.run(run(work))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    A client of the whole app, signed in as the superuser created at startup.
+    """
+    from app.app import app
+    from app.database.base import engine, init_models
+
+    async def create_schema():
+        init_models()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create_schema())
+    with TestClient(app) as client:
+        # The login form posts the CSRF token rendered by the login page
+        csrf_token = re.search(
+            r"allocateCSRFToken\('([^']+)'\)", client.get("/").text
+        ).group(1)
+        response = client.post(
+            "/auth/jwt/login", data=SUPERUSER, headers={"X-CSRF-Token": csrf_token}
+        )
+        assert response.status_code == 204
+        # The auth cookie is marked secure, so the client would not send it over http
+        client.cookies.set(AUTH_COOKIE, response.cookies[AUTH_COOKIE])
+        yield client
+        # The pooled connections belong to the event loop of the client
+        client.portal.call(engine.dispose)
@@ -0,0 +1,155 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core import activity
+from app.database.base import Base, create_engine
+from app.models.users import User, UserActivity, UserActivityDaily
+
+
+async def _run(monkeypatch, work):
+    engine = create_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(activity, "async_session_maker", session_maker)
+    async with session_maker() as db:
+        user = User(email="a@x.com", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        result = await work(db, user)
+    await engine.dispose()
+    return result
+
+
+def test_activities_are_written_in_batches(monkeypatch):
+    monkeypatch.setattr(activity.settings, "activity_batch_size", 3)
+    monkeypatch.setattr(activity.settings, "activity_flush_interval", 0.2)
+    monkeypatch.setattr(activity.settings, "activity_retention_days", 0)
+
+    async def work(db, user):
+        inserts = []
+        event.listen(
+            db.get_bind(),
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statement.startswith(
+                "INSERT INTO user_activity "
+            )
+            and inserts.append(statement),
+        )
+
+        logger = activity.ActivityLogger()
+        # Nothing is recorded before the logger is started
+        logger.log(user.id, "ignored")
+        logger.start()
+        for number in range(4):
+            logger.log(user.id, "sign-in", str(number))
+        # A full batch is written at once, the rest after the flush interval
+        await asyncio.sleep(0.05)
+        written_early = len(inserts)
+        await asyncio.sleep(0.3)
+        logger.log(user.id, "sign-out")
+        await logger.stop()
+        logger.log(user.id, "ignored")
+
+        types = await db.execute(
+            select(UserActivity.activity_type, func.count()).group_by(
+                UserActivity.activity_type
+            )
+        )
+        daily = await db.execute(
+            select(UserActivityDaily.activity_type, UserActivityDaily.activity_count)
+        )
+        return written_early, len(inserts), dict(types.all()), dict(daily.all())
+
+    assert asyncio.run(_run(monkeypatch, work)) == (
+        1,
+        3,
+        {"sign-in": 4, "sign-out": 1},
+        {"sign-in": 4, "sign-out": 1},
+    )
+
+
+def test_activities_are_dropped_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setattr(activity.settings, "activity_queue_size", 2)
+
+    async def run():
+        logger = activity.ActivityLogger()
+        logger.start()
+        logger._task.cancel()
+        for _ in range(5):
+            logger.log(uuid.uuid4(), "sign-in")
+        return logger._queue.qsize(), logger._dropped
+
+    assert asyncio.run(run()) == (2, 3)
+
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_daily_counts_add_up_across_batches(monkeypatch, upsert):
+    if not upsert:
+        # Backends without ON CONFLICT update the counts one by one
+        monkeypatch.setattr(activity, "UPSERT_INSERTS", {})
+    day = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+    async def work(db, user):
+        for batch in (["sign-in", "sign-in", "sign-up"], ["sign-in"]):
+            await activity.add_to_daily_counts(
+                db, [{"activity_date": day, "activity_type": kind} for kind in batch]
+            )
+        await activity.add_to_daily_counts(
+            db,
+            [{"activity_date": day + timedelta(days=1), "activity_type": "sign-in"}],
+        )
+        counts = await db.execute(
+            select(
+                UserActivityDaily.activity_day,
+                UserActivityDaily.activity_type,
+                UserActivityDaily.activity_count,
+            ).order_by(UserActivityDaily.activity_day, UserActivityDaily.activity_type)
+        )
+        return [(str(day), kind, count) for day, kind, count in counts.all()]
+
+    assert asyncio.run(_run(monkeypatch, work)) == [
+        ("2024-05-01", "sign-in", 3),
+        ("2024-05-01", "sign-up", 1),
+        ("2024-05-02", "sign-in", 1),
+    ]
+
+
+def test_expired_activities_are_deleted_in_batches(monkeypatch):
+    monkeypatch.setattr(activity.settings, "activity_retention_days", 30)
+    monkeypatch.setattr(activity.settings, "activity_retention_batch_size", 2)
+    now = datetime.now(timezone.utc)
+
+    async def work(db, user):
+        db.add_all(
+            UserActivity(
+                user_id=user.id,
+                activity_date=now - timedelta(days=age),
+                activity_type=str(age),
+            )
+            for age in (1, 29, 31, 40, 50, 60, 70)
+        )
+        await db.commit()
+        deleted = await activity.delete_expired_activities()
+        kept = await db.execute(select(UserActivity.activity_type))
+        return deleted, sorted(kept.scalars().all())
+
+    assert asyncio.run(_run(monkeypatch, work)) == (5, ["1", "29"])
+
+
+def test_deleting_a_user_deletes_their_activities(monkeypatch):
+    async def work(db, user):
+        db.add_all(
+            UserActivity(user_id=user.id, activity_type="sign-in") for _ in range(3)
+        )
+        await db.commit()
+        await db.delete(user)
+        await db.commit()
+        return await db.scalar(select(func.count()).select_from(UserActivity))
+
+    assert asyncio.run(_run(monkeypatch, work)) == 0
@@ -0,0 +1,96 @@
+import pytest
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import select
+
+from app.database.base import async_session_maker
+from app.models.users import User
+from app.routes.api import bulk
+
+
+def test_create_many_inserts_in_chunks_with_one_commit(role_crud, run_on_roles):
+    async def work(db):
+        rows = [{"role_name": f"role{i}"} for i in range(5)]
+        assert await role_crud.create_many(rows, db, chunk_size=2) == 5
+        existing = await role_crud.read_existing_values(
+            db, "role_name", ["ROLE1", "role4", "other"]
+        )
+        assert existing == {"role1", "role4"}
+
+    names, commits = run_on_roles(work)
+    assert names == [f"role{i}" for i in range(5)] and commits == 1
+
+
+def test_bulk_route_imports_the_valid_rows_and_reports_the_others(client):
+    response = client.post(
+        "/bulk/roles",
+        json=[{"role_name": "importer"}, {"role_name": "IMPORTER"}, {"role_name": "x"}],
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 1
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+
+
+def test_bulk_route_reads_csv_bodies_and_files(client):
+    response = client.post(
+        "/bulk/groups",
+        content="group_name,group_desc\ncsvbody,From the body\n",
+        headers={"content-type": "text/csv"},
+    )
+    assert response.json() == {"created": 1, "errors": []}
+    response = client.post(
+        "/bulk/groups",
+        files={
+            "file": ("groups.csv", b"\xef\xbb\xbfgroup_name\ncsvfile\n", "text/csv")
+        },
+    )
+    assert response.json() == {"created": 1, "errors": []}
+
+
+def test_bulk_route_hashes_the_passwords_of_the_valid_users(client):
+    response = client.post(
+        "/bulk/users",
+        json=[
+            {"email": "imported@x.com", "password": "longpassword1"},
+            {"email": "not-an-email", "password": "longpassword1"},
+            {"email": "weak@x.com", "password": "x"},
+        ],
+    )
+    result = response.json()
+    assert result["created"] == 1
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+
+    async def stored_hash():
+        async with async_session_maker() as db:
+            return await db.scalar(
+                select(User.hashed_password).where(User.email == "imported@x.com")
+            )
+
+    verified, _ = PasswordHelper().verify_and_update(
+        "longpassword1", client.portal.call(stored_hash)
+    )
+    assert verified
+
+
+@pytest.mark.parametrize(
+    "content, content_type, status_code",
+    [
+        (b"[{]", "application/json", 400),
+        (b'{"role_name": "single"}', "application/json", 400),
+        (b"role_name\n\xff\n", "text/csv", 400),
+        (b"role_name\nplain\n", "text/plain", 415),
+    ],
+)
+def test_bulk_route_rejects_unreadable_bodies(
+    client, content, content_type, status_code
+):
+    response = client.post(
+        "/bulk/roles", content=content, headers={"content-type": content_type}
+    )
+    assert response.status_code == status_code
+
+
+def test_bulk_route_rejects_too_many_rows(client, monkeypatch):
+    monkeypatch.setattr(bulk.settings, "import_max_rows", 2)
+    rows = [{"role_name": f"toomany{i}"} for i in range(3)]
+    assert client.post("/bulk/roles", json=rows).status_code == 413
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from app.core.cache import MemoryCacheBackend
+
+
+def test_memory_cache_expires_entries():
+    async def run():
+        cache = MemoryCacheBackend(max_size=10)
+        await cache.set("short", 1, ttl=0.01)
+        await cache.set("long", 2, ttl=60)
+        time.sleep(0.02)
+        return await cache.get("short"), await cache.get("long")
+
+    assert asyncio.run(run()) == (None, 2)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    async def run():
+        cache = MemoryCacheBackend(max_size=2)
+        await cache.set("a", 1, ttl=60)
+        await cache.set("b", 2, ttl=60)
+        # Reading "a" makes "b" the least recently used entry
+        await cache.get("a")
+        await cache.set("c", 3, ttl=60)
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [1, None, 3]
+
+
+def test_memory_cache_delete_and_clear():
+    async def run():
+        cache = MemoryCacheBackend()
+        await cache.set("a", 1, ttl=60)
+        await cache.set("b", 2, ttl=60)
+        await cache.delete("a")
+        await cache.delete("missing")
+        deleted = await cache.get("a")
+        await cache.clear()
+        return deleted, await cache.get("b")
+
+    assert asyncio.run(run()) == (None, None)
@@ -0,0 +1,11 @@
+def test_read_by_column_is_case_insensitive_only_with_a_lower_index(
+    role_crud, run_on_roles
+):
+    async def work(db):
+        await role_crud.create({"role_name": "Admin", "role_desc": "Everything"}, db)
+        assert (await role_crud.read_by_column(db, "role_name", "ADMIN")) is not None
+        # role_desc has no lower() index, so it is compared exactly
+        assert await role_crud.read_by_column(db, "role_desc", "everything") is None
+        assert await role_crud.read_by_column(db, "role_desc", "Everything") is not None
+
+    run_on_roles(work)
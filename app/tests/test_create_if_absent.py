@@ -0,0 +1,20 @@
+import pytest
+
+from app.routes.view import view_crud
+
+
+@pytest.mark.parametrize("on_conflict", [True, False])
+def test_create_if_absent_reports_conflicts(
+    monkeypatch, on_conflict, role_crud, run_on_roles
+):
+    if not on_conflict:
+        # Backends without ON CONFLICT insert within a savepoint instead
+        monkeypatch.setattr(view_crud, "ON_CONFLICT_INSERTS", {})
+
+    async def work(db):
+        role = await role_crud.create_if_absent({"role_name": "Admin"}, db)
+        assert role is not None and role.created is not None
+        assert await role_crud.create_if_absent({"role_name": "ADMIN"}, db) is None
+        assert await role_crud.create_if_absent({"role_name": "other"}, db)
+
+    assert run_on_roles(work) == (["Admin", "other"], 2)
@@ -0,0 +1,29 @@
+import csv
+import io
+import json
+
+
+def test_stream_all_yields_every_record_in_batches(role_crud, run_on_roles):
+    async def work(db):
+        await role_crud.create_many([{"role_name": f"role{i}"} for i in range(5)], db)
+        streamed = [
+            role.role_name
+            async for role in role_crud.stream_all(
+                db, columns=["role_name"], batch_size=2
+            )
+        ]
+        assert sorted(streamed) == [f"role{i}" for i in range(5)]
+
+    run_on_roles(work)
+
+
+def test_export_route_streams_the_users_as_csv_and_ndjson(client):
+    response = client.get("/export/users", params={"format": "csv"})
+    assert response.status_code == 200
+    emails = [row["email"] for row in csv.DictReader(io.StringIO(response.text))]
+    assert "superuser@admin.com" in emails
+
+    response = client.get("/export/users", params={"format": "ndjson"})
+    assert response.status_code == 200
+    emails = [json.loads(line)["email"] for line in response.text.splitlines()]
+    assert "superuser@admin.com" in emails
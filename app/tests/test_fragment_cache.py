@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from app.core import fragment_cache
+from app.core.fragment_cache import (
+    bump_data_version,
+    cascaded_tables,
+    data_version,
+)
+from app.models.groups import Group, UserGroupLink
+from app.models.users import Role, User
+
+
+def test_data_version_follows_the_write_generations():
+    async def run():
+        first = await data_version(Group, UserGroupLink)
+        unchanged = await data_version(Group, UserGroupLink)
+        await bump_data_version(Role.__tablename__)
+        other_table = await data_version(Group, UserGroupLink)
+        await bump_data_version(UserGroupLink.__tablename__)
+        written = await data_version(Group, UserGroupLink)
+        return first == unchanged == other_table, written != first
+
+    assert asyncio.run(run()) == (True, True)
+
+
+def test_in_process_generations_expire_with_the_fragments(monkeypatch):
+    # Writes of the other workers are not seen by an in-process cache, so the versions
+    # it hands out are renewed once the fragments rendered under them expire
+    monkeypatch.setattr(fragment_cache.settings, "fragment_cache_ttl", 0.05)
+
+    async def run():
+        await bump_data_version(Group.__tablename__)
+        first = await data_version(Group)
+        unchanged = await data_version(Group)
+        time.sleep(0.1)
+        return first == unchanged, first != await data_version(Group)
+
+    assert asyncio.run(run()) == (True, True)
+
+
+def test_deleting_a_user_changes_the_tables_it_cascades_to():
+    tables = cascaded_tables(User)
+    assert {"group_users", "upload", "user_activity", "user_profiles"} <= set(tables)
+
+
+def test_pages_are_revalidated_until_their_tables_are_written(client):
+    response = client.get("/role")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get("/role", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/bulk/roles", json=[{"role_name": "revalidated"}])
+    response = client.get("/role", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "revalidated" in response.text
@@ -0,0 +1,87 @@
+import asyncio
+import uuid
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.base import Base
+from app.models.groups import UserGroupLink
+from app.routes.view.view_crud import SQLAlchemyCRUD
+
+group_user_crud = SQLAlchemyCRUD[UserGroupLink](UserGroupLink)
+
+GROUP_ID = uuid.uuid4()
+USER_IDS = [uuid.uuid4() for _ in range(6)]
+
+
+async def _sync(linked, desired, scope=None):
+    """
+    Links GROUP_ID to the users at the `linked` indexes, then syncs the links to the
+    `desired` ones. Returns the counts, the users left linked and the statements run.
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        db.add_all(
+            UserGroupLink(group_id=GROUP_ID, user_id=USER_IDS[index])
+            for index in linked
+        )
+        # Links of another group are never touched
+        db.add(UserGroupLink(group_id=uuid.uuid4(), user_id=USER_IDS[0]))
+        await db.commit()
+
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        counts = await group_user_crud.sync_links(
+            db,
+            "group_id",
+            GROUP_ID,
+            "user_id",
+            [USER_IDS[index] for index in desired],
+            scope_ids=None if scope is None else [USER_IDS[index] for index in scope],
+        )
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        query = await db.execute(
+            select(UserGroupLink.user_id).where(UserGroupLink.group_id == GROUP_ID)
+        )
+        left = sorted(USER_IDS.index(user_id) for user_id in query.scalars().all())
+        others = await db.scalar(
+            select(UserGroupLink.id).where(UserGroupLink.group_id != GROUP_ID)
+        )
+    await engine.dispose()
+    assert others is not None
+    return counts, left, [statement.split()[0] for statement in statements]
+
+
+def test_sync_links_adds_and_removes_the_difference():
+    counts, left, _ = asyncio.run(_sync(linked=[0, 1, 2], desired=[1, 2, 3, 4]))
+    assert counts == (2, 1)
+    assert left == [1, 2, 3, 4]
+
+
+def test_sync_links_without_changes_writes_nothing():
+    counts, left, statements = asyncio.run(_sync(linked=[0, 1], desired=[1, 0]))
+    assert counts == (0, 0)
+    assert left == [0, 1]
+    assert statements == ["SELECT"]
+
+
+def test_sync_links_only_removes_within_the_scope():
+    # User 0 was not offered on the form, so it stays linked
+    counts, left, _ = asyncio.run(
+        _sync(linked=[0, 1, 2], desired=[2, 5], scope=[1, 2, 5])
+    )
+    assert counts == (1, 1)
+    assert left == [0, 2, 5]
+
+
+def test_sync_links_uses_set_based_statements():
+    counts, _, statements = asyncio.run(_sync(linked=[0, 1, 2], desired=[3, 4, 5]))
+    assert counts == (3, 3)
+    # One SELECT, one bulk INSERT and one DELETE, whatever the number of links
+    assert statements == ["SELECT", "INSERT", "DELETE"]
@@ -0,0 +1,134 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.fragment_cache import bump_data_version
+from app.database.base import Base
+from app.models.users import Role, User
+from app.routes.view.view_crud import (
+    SQLAlchemyCRUD,
+    decode_cursor,
+    encode_cursor,
+)
+
+role_crud = SQLAlchemyCRUD[Role](Role)
+
+
+async def _read_pages(backwards_from_end: bool = False):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as db:
+        # All rows share the same server side timestamp, so ordering relies on the id
+        db.add_all([Role(role_name=f"role-{i}") for i in range(5)])
+        await db.commit()
+
+        pages = []
+        page = await role_crud.read_page(db, limit=2)
+        pages.append(page)
+        while page.next_cursor:
+            page = await role_crud.read_page(db, cursor=page.next_cursor, limit=2)
+            pages.append(page)
+
+        previous = None
+        if backwards_from_end:
+            previous = await role_crud.read_page(
+                db, cursor=pages[-1].prev_cursor, limit=2, backwards=True
+            )
+    await engine.dispose()
+    return pages, previous
+
+
+def test_cursor_round_trip():
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created, id)) == (created, id)
+
+
+def test_invalid_cursor_raises_400():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_read_page_walks_all_records_once():
+    pages, _ = asyncio.run(_read_pages())
+    names = [role.role_name for page in pages for role in page.items]
+    assert [len(page.items) for page in pages] == [2, 2, 1]
+    assert sorted(names) == [f"role-{i}" for i in range(5)]
+    assert pages[0].prev_cursor is None
+    assert pages[-1].next_cursor is None
+
+
+def test_read_page_backwards_returns_previous_page():
+    pages, previous = asyncio.run(_read_pages(backwards_from_end=True))
+    assert [role.id for role in previous.items] == [role.id for role in pages[1].items]
+    assert previous.next_cursor is not None
+
+
+def test_read_page_total_is_counted_once_until_a_write():
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        counts = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: "count(" in statement
+            and counts.append(statement),
+        )
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as db:
+            await role_crud.create_many(
+                [{"role_name": f"role-{i}"} for i in range(5)], db
+            )
+            first = await role_crud.read_page(db, limit=2, with_total=True)
+            second = await role_crud.read_page(
+                db, cursor=first.next_cursor, limit=2, with_total=True
+            )
+            matching = await role_crud.read_page(
+                db, filters=[Role.role_name > "role-2"], with_total=True
+            )
+            counted = len(counts)
+            await role_crud.create({"role_name": "role-5"}, db)
+            after_write = await role_crud.read_page(db, limit=2, with_total=True)
+        await engine.dispose()
+        return (
+            [first.total, second.total, matching.total, after_write.total],
+            first.total_estimated,
+            counted,
+            len(counts),
+        )
+
+    assert asyncio.run(run()) == ([5, 5, 2, 6], False, 2, 3)
+
+
+def test_count_follows_the_writes_of_the_tables_its_filters_read(
+    role_crud, run_on_roles
+):
+    async def work(db):
+        role = await role_crud.create({"role_name": "held"}, db)
+        await role_crud.create({"role_name": "unused"}, db)
+        held = [Role.id.in_(select(User.role_id))]
+        assert await role_crud.count(db, filters=held) == (0, False)
+        db.add(User(email="holder@x.com", hashed_password="x", role_id=role.id))
+        await db.commit()
+        # Unchanged until the users table is written through the app
+        assert await role_crud.count(db, filters=held) == (0, False)
+        await bump_data_version(User.__tablename__)
+        assert await role_crud.count(db, filters=held) == (1, False)
+
+    run_on_roles(work)
+
+
+def test_every_table_has_a_created_id_index():
+    for table in Base.metadata.sorted_tables:
+        columns = [[column.name for column in index.columns] for index in table.indexes]
+        assert ["created", "id"] in columns, table.name
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.minio_core import SDKPool
+
+
+def test_the_timeout_starts_when_a_worker_runs_the_call():
+    pool = SDKPool(1, "test")
+
+    async def run():
+        # The second call waits for the first one longer than its own timeout
+        slow = asyncio.create_task(pool.run(1, time.sleep, 0.2))
+        queued = await pool.run(0.1, lambda: "done")
+        await slow
+        return queued
+
+    assert asyncio.run(run()) == "done"
+    assert pool.stats()["timeouts"] == 0
+    pool.shutdown()
+
+
+def test_a_call_running_past_its_timeout_is_abandoned():
+    pool = SDKPool(1, "test")
+    with pytest.raises(TimeoutError):
+        asyncio.run(pool.run(0.05, time.sleep, 0.2))
+    assert pool.stats()["timeouts"] == 1
+    pool.shutdown()
@@ -0,0 +1,34 @@
+import uuid
+from types import SimpleNamespace
+
+from app.core.minio_core import minio
+from app.routes.view.upload import _upload_token
+
+
+class _ObjectStore:
+    """
+    The MinIO SDK calls made by the presigned upload routes, for a file the browser
+    uploaded.
+    """
+
+    def presigned_put_object(self, bucket, name, expires):
+        return f"http://minio/{bucket}/{name}?signature"
+
+    def stat_object(self, bucket, name):
+        return SimpleNamespace(etag="1234", size=10, content_type="text/plain")
+
+
+def test_an_upload_is_recorded_once_for_the_user_it_was_issued_to(client, monkeypatch):
+    monkeypatch.setattr(minio, "minio_client", _ObjectStore())
+    presign = client.post("/post_presigned_upload", data={"filename": "a.txt"}).json()
+    form = {"upload_token": presign["upload_token"], "name": "a.txt", "source": "x"}
+
+    response = client.post("/post_upload_complete", data=form)
+    assert response.status_code == 200 and "HX-Trigger" in response.headers
+    assert client.post("/post_upload_complete", data=form).status_code == 409
+
+    another_user = SimpleNamespace(id=uuid.uuid4())
+    form["upload_token"] = _upload_token(presign["unique_name"], another_user)
+    assert client.post("/post_upload_complete", data=form).status_code == 403
+    form["upload_token"] = presign["upload_token"] + "x"
+    assert client.post("/post_upload_complete", data=form).status_code == 403
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.fragment_cache import bump_data_version
+from app.database import db as database
+from app.database.base import create_engine
+from app.database.db import (
+    READ_PRIMARY_COOKIE,
+    CurrentAsyncSession,
+    CurrentReadSession,
+    read_primary_after_write,
+    read_version,
+)
+from app.models.users import Role
+
+
+def test_reads_go_to_the_replica_unless_the_client_just_wrote(monkeypatch, tmp_path):
+    primary = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", read_only=True
+    )
+    monkeypatch.setattr(database.settings, "database_replica_url", str(replica.url))
+    monkeypatch.setattr(database, "async_session_maker", async_sessionmaker(primary))
+    monkeypatch.setattr(database, "replica_session_maker", async_sessionmaker(replica))
+
+    app = FastAPI()
+    app.middleware("http")(read_primary_after_write)
+
+    def database_file(db):
+        return os.path.basename(db.get_bind().url.database)
+
+    @app.get("/read")
+    async def read(db: CurrentReadSession):
+        return database_file(db)
+
+    @app.post("/write")
+    async def write(db: CurrentAsyncSession):
+        return database_file(db)
+
+    with TestClient(app) as client:
+        assert client.get("/read").json() == "replica.db"
+        response = client.post("/write")
+        assert response.json() == "primary.db"
+        assert READ_PRIMARY_COOKIE in response.cookies
+        # The cookie set by the write sends the next reads to the primary
+        assert client.get("/read").json() == "primary.db"
+        assert READ_PRIMARY_COOKIE not in client.get("/read").cookies
+        client.cookies.clear()
+        assert client.get("/read").json() == "replica.db"
+
+    asyncio.run(primary.dispose())
+    asyncio.run(replica.dispose())
+
+
+def test_replica_reads_of_a_table_just_written_get_no_version(monkeypatch, tmp_path):
+    replica = create_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", read_only=True
+    )
+    monkeypatch.setattr(database, "replica_engine", replica)
+
+    async def run():
+        await bump_data_version(Role.__tablename__)
+        async with async_sessionmaker(replica)() as db:
+            from_replica = await read_version(db, Role)
+        async with database.async_session_maker() as db:
+            from_primary = await read_version(db, Role)
+        await replica.dispose()
+        return from_replica, from_primary
+
+    from_replica, from_primary = asyncio.run(run())
+    # The rows read from the replica may be outdated, so they are not cached
+    assert from_replica is None and from_primary is not None
@@ -0,0 +1,17 @@
+from app.core.reference_cache import reference_rows
+from app.models.users import Role
+
+
+def test_reference_rows_are_cached_until_the_table_is_written(role_crud, run_on_roles):
+    async def work(db):
+        await role_crud.create({"role_name": "first"}, db)
+        roles = await reference_rows(db, Role)
+        assert [role["role_name"] for role in roles] == ["first"]
+        await db.execute(Role.__table__.delete())
+        # Rows changed behind SQLAlchemyCRUD are not seen until a write through it
+        assert await reference_rows(db, Role) == roles
+        await role_crud.create({"role_name": "second"}, db)
+        roles = await reference_rows(db, Role)
+        assert [role["role_name"] for role in roles] == ["second"]
+
+    run_on_roles(work)
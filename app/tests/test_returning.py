@@ -0,0 +1,33 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+
+def test_update_returning_uses_one_statement(role_crud, run_on_roles):
+    statements = []
+
+    async def work(db):
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        role = await role_crud.create({"role_name": "first"}, db)
+        event.listen(db.bind.sync_engine, "before_cursor_execute", capture)
+        updated = await role_crud.update(db, role.id, {"role_name": "renamed"})
+        event.remove(db.bind.sync_engine, "before_cursor_execute", capture)
+        assert updated is role
+        assert role.role_name == "renamed"
+
+    assert run_on_roles(work) == (["renamed"], 2)
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE") and "RETURNING" in statements[0]
+
+
+def test_delete_missing_record_raises_404(role_crud, run_on_roles):
+    async def work(db):
+        with pytest.raises(HTTPException) as error:
+            await role_crud.delete(db, uuid.uuid4())
+        assert error.value.status_code == 404
+
+    run_on_roles(work)
@@ -1,6 +1,8 @@
 import pytest
 from pydantic import ValidationError
+from sqlalchemy import select
 
+from app.models.users import User
 from app.schema.users import RoleBase, RoleCreate
 
 
@@ -31,3 +33,20 @@ def test_create_roles_with_default_desc():
     # Test default value for role_desc
     role = RoleBase(role_name="admin")
     assert role.role_desc is None
+
+
+def test_deleting_a_role_held_by_several_users(role_crud, run_on_roles):
+    async def work(db):
+        role = await role_crud.create({"role_name": "shared"}, db)
+        db.add_all(
+            User(email=f"user{i}@x.com", hashed_password="x", role_id=role.id)
+            for i in range(3)
+        )
+        await db.commit()
+        await role_crud.delete(db, role.id)
+        # The users are kept, without a role
+        role_ids = (await db.execute(select(User.role_id))).scalars().all()
+        assert role_ids == [None, None, None]
+
+    names, _ = run_on_roles(work)
+    assert names == []
@@ -0,0 +1,25 @@
+import pytest
+
+from app.core.stats import read_counters
+from app.models.stats import StatCounter
+from app.routes.view.view_crud import unit_of_work
+
+
+def test_counters_follow_creates_and_deletes(role_crud, run_on_roles):
+    async def work(db):
+        db.add(StatCounter(name="roles", value=0))
+        await db.commit()
+        role = await role_crud.create({"role_name": "first"}, db)
+        await role_crud.create_many(
+            [{"role_name": "second"}, {"role_name": "third"}], db
+        )
+        await role_crud.delete(db, role.id)
+        # A rolled back write leaves the counter unchanged too
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(db):
+                await role_crud.create({"role_name": "fourth"}, db)
+                raise RuntimeError
+        counters = await read_counters(db)
+        assert counters["roles"] == 2 and counters["users"] == 0
+
+    assert run_on_roles(work) == (["second", "third"], 4)
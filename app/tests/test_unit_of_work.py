@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.routes.view.view_crud import unit_of_work
+
+
+def test_unit_of_work_commits_once(role_crud, run_on_roles):
+    async def work(db):
+        async with unit_of_work(db):
+            role = await role_crud.create({"role_name": "first"}, db)
+            await role_crud.create({"role_name": "second"}, db)
+            await role_crud.update(db, role.id, {"role_name": "renamed"})
+
+    assert run_on_roles(work) == (["renamed", "second"], 1)
+
+
+def test_unit_of_work_rolls_back_on_error(role_crud, run_on_roles):
+    async def work(db):
+        async with unit_of_work(db):
+            await role_crud.create({"role_name": "first"}, db)
+            raise RuntimeError("form rejected")
+
+    assert run_on_roles(work) == ([], 0)
+
+
+def test_without_unit_of_work_each_write_commits(role_crud, run_on_roles):
+    async def work(db):
+        role = await role_crud.create({"role_name": "first"}, db)
+        await role_crud.update(db, role.id, {"role_name": "renamed"})
+
+    assert run_on_roles(work) == (["renamed"], 2)
+
+
+def test_update_missing_record_raises_404(role_crud, run_on_roles):
+    async def work(db):
+        with pytest.raises(HTTPException) as error:
+            await role_crud.update(db, uuid.uuid4(), {"role_name": "missing"})
+        assert error.value.status_code == 404
+
+    run_on_roles(work)
@@ -0,0 +1,23 @@
+from sqlalchemy import select
+
+from app.core.cache import cache
+from app.database.base import async_session_maker
+from app.database.security import _user_cache_key
+from app.models.users import User
+
+
+def test_the_cached_user_holds_no_password_hash(client):
+    async def superuser_id():
+        async with async_session_maker() as db:
+            return await db.scalar(
+                select(User.id).where(User.email == "superuser@admin.com")
+            )
+
+    # The first request caches the user, the second one is served from the cache
+    assert client.get("/role").status_code == 200
+    assert client.get("/role").status_code == 200
+
+    key = _user_cache_key(client.portal.call(superuser_id))
+    columns = client.portal.call(cache.get, key)
+    assert columns["email"] == "superuser@admin.com" and columns["is_superuser"]
+    assert "hashed_password" not in columns
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.users import Role, User
+from app.routes.view.user import _prefix_match, _prefix_upper_bound
+
+
+def test_search_route_matches_the_start_of_the_words(client):
+    response = client.post(
+        "/bulk/users",
+        content="email,password\nsearchalice@x.com,longpassword1\n"
+        "searchbob@x.com,longpassword1\n",
+        headers={"content-type": "text/csv"},
+    )
+    assert response.json()["created"] == 2
+
+    response = client.get("/search_users", params={"q": "SEARCHALICE"})
+    assert response.status_code == 200
+    assert "searchalice@x.com" in response.text
+    assert "searchbob@x.com" not in response.text
+    # Words only match from their start
+    assert "searchalice@x.com" not in client.get("/search_users?q=alice").text
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        ("abc", "abd"),
+        ("ab\U0010ffff", "ac"),
+        ("\U0010ffff\U0010ffff", None),
+        ("a\ud7ff", "a\ue000"),
+    ],
+)
+def test_prefix_upper_bound(prefix, expected):
+    assert _prefix_upper_bound(prefix) == expected
+
+
+def test_prefix_match_accepts_the_last_code_point(role_crud, run_on_roles):
+    async def work(db):
+        for name in ["z\U0010ffffz", "z\U0010fffe", "za"]:
+            await role_crud.create({"role_name": name}, db)
+        match = _prefix_match(Role.role_name, "z\U0010ffff", "sqlite")
+        assert await role_crud.count(db, filters=[match]) == (1, False)
+
+    run_on_roles(work)
+
+
+def test_prefix_match_only_uses_like_outside_of_sqlite():
+    # A range bound by code point does not follow the collations of PostgreSQL
+    match = _prefix_match(User.email, "abc", "postgresql")
+    sql = str(match.compile(dialect=postgresql.dialect()))
+    assert "LIKE" in sql and "<" not in sql